@@ -16,7 +16,7 @@ import random
 
 import telegram
 from telegram import Update
-from telegram.ext import Application, CallbackContext, CommandHandler as TelegramCommandHandler
+from telegram.ext import Application, CallbackContext, CallbackQueryHandler, CommandHandler as TelegramCommandHandler
 from telegram.error import NetworkError, Conflict
 
 from src.config.settings import Settings
@@ -26,7 +26,7 @@ from src.services.ai_service import AIService
 from src.bot.handlers import MessageHandler
 from src.bot.commands import CommandHandler
 from src.bot.conversation import ConversationManager
-from src.utils.message_utils import MessageUtils
+from src.utils.message_utils import MessageUtils, PAGE_CALLBACK_PREFIX
 from src.utils.browser_use_patch import apply_patches
 
 # Configure logging
@@ -259,6 +259,9 @@ class BookingBot:
             # Clean up all browser instances
             await self.browser_service.cleanup()
             
+            # Write out buffered chat history and close the database pool
+            await MessageUtils().db.close()
+            
             # Clear message data
             MessageUtils._user_data.clear()
             
@@ -301,7 +304,10 @@ class BookingBot:
     def run(self):
         """Run the bot in either polling or webhook mode"""
         try:
-            # Add handlers
+            # Add handlers; paging buttons go first so no other handler swallows them
+            self.application.add_handler(
+                CallbackQueryHandler(MessageUtils.handle_page_callback, pattern=f"^{PAGE_CALLBACK_PREFIX}")
+            )
             self.application.add_handler(
                 self.conversation_manager.get_conversation_handler()
             )
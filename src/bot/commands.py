@@ -62,7 +62,7 @@ class CommandHandler:
             return PROFILE_NAME
             
         elif choice == "👤 View Profile":
-            profile = self.message_utils.get_user_profile(user_id)
+            profile = await self.message_utils.get_user_profile(user_id)
             if profile:
                 profile_text = (
                     "Your saved profile:\n"
@@ -77,18 +77,18 @@ class CommandHandler:
             return ConversationHandler.END
             
         elif choice == "🔄 Use Saved Profile for Booking":
-            profile = self.message_utils.get_user_profile(user_id)
+            profile = await self.message_utils.get_user_profile(user_id)
             if profile and all(profile.get(k) for k in ['name', 'email', 'phone']):
                 # Copy profile to booking info
                 for key, value in profile.items():
-                    self.message_utils.set_booking_info(user_id, key, value)
+                    await self.message_utils.set_booking_info(user_id, key, value)
                 await update.message.reply_text("Profile loaded for booking! ✅")
             else:
                 await update.message.reply_text("Please set up your profile first using 'Update Profile'")
             return ConversationHandler.END
             
         elif choice == "❌ Clear Saved Profile":
-            self.message_utils.clear_user_profile(user_id)
+            await self.message_utils.clear_user_profile(user_id)
             await update.message.reply_text("Profile cleared! 🗑️")
             return ConversationHandler.END
 
@@ -99,19 +99,19 @@ class CommandHandler:
         current_state = context.user_data.get('profile_step', PROFILE_NAME)
 
         if current_state == PROFILE_NAME:
-            self.message_utils.set_user_profile(user_id, 'name', message)
+            await self.message_utils.set_user_profile(user_id, 'name', message)
             await update.message.reply_text("Great! Now enter your email:")
             context.user_data['profile_step'] = PROFILE_EMAIL
             return PROFILE_EMAIL
             
         elif current_state == PROFILE_EMAIL:
-            self.message_utils.set_user_profile(user_id, 'email', message)
+            await self.message_utils.set_user_profile(user_id, 'email', message)
             await update.message.reply_text("Perfect! Finally, enter your phone number:")
             context.user_data['profile_step'] = PROFILE_PHONE
             return PROFILE_PHONE
             
         elif current_state == PROFILE_PHONE:
-            self.message_utils.set_user_profile(user_id, 'phone', message)
+            await self.message_utils.set_user_profile(user_id, 'phone', message)
             await update.message.reply_text("Profile updated successfully! ✅")
             context.user_data.pop('profile_step', None)
             return ConversationHandler.END
@@ -71,7 +71,7 @@ class MessageHandler:
         
         try:
             # Store query for context
-            MessageUtils.add_message(user_id, "user", query)
+            await self.message_utils.add_to_history(user_id, "user", query)
             
             # First message to user
             loading_message = await context.bot.send_message(
@@ -124,7 +124,7 @@ class MessageHandler:
             self.logger.info(f"Generated AI response, length: {len(response) if response else 0}")
             
             # Store AI response for context
-            MessageUtils.add_message(user_id, "assistant", response)
+            await self.message_utils.add_to_history(user_id, "assistant", response)
             
             # Delete the loading message and send the final response
             try:
@@ -142,7 +142,7 @@ class MessageHandler:
             error_message = f"I'm sorry, I encountered an error while searching: {str(e)}. Please try again with a different query."
             
             # Store error response for context
-            MessageUtils.add_message(user_id, "assistant", error_message)
+            await self.message_utils.add_to_history(user_id, "assistant", error_message)
             
             return error_message
 
@@ -230,10 +230,10 @@ class MessageHandler:
         
         try:
             # Store query for context
-            MessageUtils.add_message(user_id, "user", query)
+            await self.message_utils.add_to_history(user_id, "user", query)
             
             # Get previous conversation history
-            history = MessageUtils.get_messages(user_id)
+            history = await self.message_utils.get_user_history(user_id)
             self.logger.info(f"Retrieved conversation history with {len(history) if history else 0} messages")
             
             # Generate AI response
@@ -242,7 +242,7 @@ class MessageHandler:
             self.logger.info(f"Generated AI response, length: {len(response) if response else 0}")
             
             # Store AI response for context
-            MessageUtils.add_message(user_id, "assistant", response)
+            await self.message_utils.add_to_history(user_id, "assistant", response)
             
             return response
             
@@ -251,7 +251,7 @@ class MessageHandler:
             error_message = "I'm sorry, I encountered an error while generating a response. Please try again."
             
             # Store error response for context
-            MessageUtils.add_message(user_id, "assistant", error_message)
+            await self.message_utils.add_to_history(user_id, "assistant", error_message)
             
             return error_message
 
@@ -0,0 +1,17 @@
+"""
+One-time .env loading shared by settings and the script entrypoints.
+"""
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@lru_cache(maxsize=1)
+def load_env_once() -> bool:
+    """
+    Load the .env file into os.environ on the first call only.
+
+    Returns:
+        bool: Whether a .env file was found and loaded
+    """
+    return load_dotenv()
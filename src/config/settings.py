@@ -6,10 +6,11 @@ import logging
 from dataclasses import dataclass
 from typing import Optional
 
-from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import SecretStr
 
+from src.config._env import load_env_once
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,8 +20,8 @@ class Settings:
 
     def __init__(self):
         """Initialize settings from environment variables"""
-        # Load environment variables
-        load_dotenv()
+        # Load environment variables (parsed once per process)
+        load_env_once()
 
         # Bot settings
         self.BOT_TOKEN: str = self._get_env('TELEGRAM_BOT_TOKEN')
@@ -61,6 +62,13 @@ class Settings:
             'DEEPSEEK_MODEL', 'deepseek-reasoner')
         self.CLAUDE_MODEL: str = self._get_env(
             'CLAUDE_MODEL', 'anthropic/claude-3-7-sonnet-20250219')
+        # Sonnet drives the browser agent; Haiku handles its page-extraction calls
+        self.CLAUDE_SONNET_MODEL: str = self._get_env(
+            'CLAUDE_SONNET_MODEL', self.CLAUDE_MODEL)
+        self.CLAUDE_HAIKU_MODEL: str = self._get_env(
+            'CLAUDE_HAIKU_MODEL', 'anthropic/claude-3-5-haiku-20241022')
+        # Prompt cache lifetime for browser-agent scaffolds: '1h' or '5m'
+        self.CLAUDE_CACHE_TTL: str = self._get_env('CLAUDE_CACHE_TTL', '1h')
 
         # Initialize AI models
         self.deepseek_llm = self._initialize_deepseek()
@@ -78,6 +86,13 @@ class Settings:
         # Supabase settings
         self.SUPABASE_URL: str = self._get_env('SUPABASE_URL')
         self.SUPABASE_KEY: str = self._get_env('SUPABASE_KEY')
+        # Optional direct Postgres DSN (Supavisor session mode, port 5432);
+        # when set, queries bypass the REST API and use an asyncpg pool
+        self.SUPABASE_PG_DSN: str = self._get_env('SUPABASE_PG_DSN', '')
+        # asyncpg prepared-statement cache; 0 is required for Supavisor transaction
+        # mode (port 6543), session mode can enable it for plan reuse
+        self.SUPABASE_PG_STATEMENT_CACHE_SIZE: int = self._get_env_int(
+            'SUPABASE_PG_STATEMENT_CACHE_SIZE', 0)
 
         # Validate settings
         self._validate_settings()
@@ -5,12 +5,18 @@ import asyncio
 import logging
 import os
 import random
+import re
 import time
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Any, Callable, Optional, List, Tuple, Type
 
 from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.agent.prompts import SystemPrompt
 from browser_use.agent.service import Agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
 from src.config.settings import Settings
@@ -18,36 +24,502 @@ from src.utils.message_utils import MessageUtils
 
 logger = logging.getLogger(__name__)
 
+# Error classifiers for agent failures, matched case-insensitively against str(e)
+_PLAYWRIGHT_MISSING_RE = re.compile(r"executable doesn't exist|please run the following command", re.IGNORECASE)
+_BROWSER_CONNECTION_ERROR_RE = re.compile(r"connection|websocket|cdp|browser", re.IGNORECASE)
+_API_OVERLOAD_ERROR_RE = re.compile(r"overloaded|502|too many requests|rate limit", re.IGNORECASE)
+_NETWORK_ERROR_RE = re.compile(r"timeout|connection|network|socket", re.IGNORECASE)
+
+# Reservation detail patterns used by generate_task_prompt, matched against lowercased text
+_PARTY_SIZE_RES = [re.compile(p) for p in (
+    r'(\d+)\s*people',
+    r'for\s*(\d+)',
+    r'party\s*of\s*(\d+)',
+    r'group\s*of\s*(\d+)',
+)]
+_TIME_RES = [re.compile(p) for p in (
+    r'(\d+)(?::(\d+))?\s*(am|pm)',
+    r'at\s*(\d+)(?::(\d+))?\s*(am|pm)',
+    r'at\s*(\d+)',
+)]
+_BOLD_RE = re.compile(r'\*\*([^*]+)\*\*')
+_NUMBERED_RE = re.compile(r'(\d+)[.)-]\s+\*\*([^*]+)\*\*')
+_BULLET_RE = re.compile(r'-\s+\*\*([^*]+)\*\*')
+_NUM_RE = re.compile(r'(\d+)')
+# Role prefixes factored by first letter, so most line starts fail on one character
+_ROLE_SPLIT_RE = re.compile(r'^(U(?:ser)?:|A(?:ssistant)?:)\s*', re.MULTILINE)
+
+# Phrases that mark a query as referring to an item from a previous answer
+_REFERENCE_INDICATORS = ("first", "second", "third", "1st", "2nd", "3rd", "that one", "last one")
+
+# Ordinal words mapped to list indexes, checked in order
+_ORDINAL_MAP = {"first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2, "fourth": 3, "4th": 3}
+
+# Relative date keywords, checked in order: (keyword, target weekday or None for
+# "relative to today", extra days, whether the date starts a two-day weekend span)
+_DATE_KEYWORDS = (
+    ("next weekend", 5, 7, True),
+    ("this weekend", 5, 0, True),
+    ("saturday", 5, 0, False),
+    ("sunday", 6, 0, False),
+    ("this friday", 4, 0, False),
+    ("tomorrow", None, 1, False),
+)
+
+# Static task scaffolds. These are sent to Claude as a prompt-cached system block,
+# so they must stay byte-identical between calls: never interpolate into them.
+# Everything request-specific goes into the task message built by generate_task_prompt,
+# which always starts with DYNAMIC_DELIMITER.
+DYNAMIC_DELIMITER = "===DYNAMIC==="
+
+# Static settings for the standalone hotel/restaurant search agents
+_HOTEL_AGENT_CFG = {
+    "name": "HotelSearchAgent",
+}
+_RESTAURANT_AGENT_CFG = {
+    "name": "RestaurantSearchAgent",
+}
+
+STATIC_SEARCH_SCAFFOLD = """
+!!! IMPORTANT - READ CAREFULLY !!!
+
+STEP 1: UNDERSTAND WHAT THE USER IS ASKING FOR
+- Read the REQUEST SUMMARY in the dynamic section of the task
+
+TIME LIMIT: 90 seconds total
+
+SEARCH STEPS:
+1. [15s] VERIFY WHAT THE USER IS LOOKING FOR:
+   - If they mentioned a specific restaurant by name (like Yardbird or Amber), search for that
+   - If they said "the second one" or similar, find that item in the previous list
+   - Remember they're asking about availability for the party size and time given in SEARCH DETAILS
+
+2. [20s] Go to the official website of this SPECIFIC place:
+   - For restaurants: Search for "[restaurant name] hong kong official website"
+   - Use the restaurant's official site first before third-party booking sites
+
+3. [30s] Check real-time availability for the date, time and party size given in SEARCH DETAILS:
+   - Look for reservation system, booking form, or contact information
+   - MOST IMPORTANTLY: Find and copy the EXACT BOOKING URL for this restaurant
+
+4. [25s] Gather all relevant details:
+   - Whether there is availability for the exact requested time/date/party size
+   - If the exact time is not available, what alternatives are offered
+   - If they don't take reservations, explain their policy clearly
+   - Booking conditions and contact information
+   - Price range if available (average cost per person)
+   - The DIRECT BOOKING LINK that a user could click to make a reservation
+
+FORMAT RESULTS:
+- Start with a clear statement about the specific restaurant and its availability
+- Be explicit about which restaurant you checked
+- Include price range if available
+- Always include the DIRECT BOOKING LINK if available
+- End with an offer to book on behalf of the user
+
+IMPORTANT: 
+- Make absolutely certain you are checking the CORRECT restaurant from the conversation.
+- The booking link is CRITICAL - users need to be able to book directly.
+- If you find a booking platform (OpenTable, Resy, etc.), provide the EXACT link to that specific restaurant.
+"""
+
+STATIC_BOOKING_SCAFFOLD = """
+Using the conversation context provided with the task, proceed with booking exactly what the user is asking for in their most recent request.
+Be sure to focus on the specific restaurant and booking details mentioned in the conversation history.
+
+TIME LIMIT: 90 seconds
+
+STEPS:
+1. [20s] Identify the exact place to book based on the conversation
+   - If they mentioned a specific restaurant by name, book that one
+   - If they referred to "the second one" or similar, find that item in the previous list
+
+2. [30s] Access the official booking system for the specific place
+   - Use the party size, date and time given in BOOKING DETAILS
+
+3. [40s] Enter all required customer details
+   - Use the following placeholders for personal information:
+   - Name: user_name
+   - Email: user_email
+   - Phone: user_phone
+
+FORMAT RESULTS:
+- Booking confirmation details
+- Important information about the booking
+- Next steps required to complete the booking
+- Contact information
+"""
+
+STATIC_DEFAULT_SCAFFOLD = """
+Using the conversation context provided with the task, focus on finding information about exactly what the user is asking about in their most recent request.
+Pay special attention if they're referring to something specific from earlier in the conversation.
+
+TIME LIMIT: 90 seconds total
+
+SEARCH STEPS:
+1. [20s] Identify the specific place the user is referring to
+2. [20s] Go directly to official website/platform for that specific place
+3. [30s] Check real-time information and availability for the specified party size and time
+4. [20s] Gather important details and booking information
+
+FORMAT RESULTS CLEARLY WITH ALL FOUND INFORMATION.
+"""
+
+
+def _cached_text_block(text: str, ttl: str = "5m") -> Dict[str, Any]:
+    """Wrap text in a content block marked as an Anthropic prompt-cache breakpoint."""
+    cache_control = {"type": "ephemeral"}
+    if ttl == "1h":
+        cache_control["ttl"] = "1h"
+    return {"type": "text", "text": text, "cache_control": cache_control}
+
+
+@lru_cache(maxsize=None)
+def _scaffold_system_prompt(scaffold: str, ttl: str = "5m") -> Type[SystemPrompt]:
+    """
+    Build a browser_use SystemPrompt class that appends a task scaffold to the
+    agent's own system message, with each block as its own prompt-cache breakpoint.
+    
+    The agent's message carries the action (tool) descriptions and is identical
+    for every task, so it is cached ahead of the per-task-type scaffold: switching
+    scaffolds only invalidates the second block. In browser_use 0.1.37 that message
+    is rendered only from the fixed rules, max_actions_per_step and the registered
+    actions' schemas; the current date/time goes into each step's user message
+    instead. Recheck this ordering when upgrading browser_use or registering
+    custom actions.
+    
+    Args:
+        scaffold: Static task scaffold text
+        ttl: Prompt cache lifetime ('5m' or '1h')
+        
+    Returns:
+        Type[SystemPrompt]: SystemPrompt subclass to pass to Agent
+    """
+    class ScaffoldSystemPrompt(SystemPrompt):
+        def get_system_message(self) -> SystemMessage:
+            agent_message = super().get_system_message()
+            return SystemMessage(content=[
+                _cached_text_block(agent_message.content, ttl),
+                _cached_text_block(scaffold, ttl),
+            ])
+
+    return ScaffoldSystemPrompt
+
+
+def _parse_history(history_context: str) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Split conversation history into user and assistant messages.
+    
+    Args:
+        history_context: Conversation history with 'User:'/'Assistant:' prefixed messages
+        
+    Returns:
+        Tuple: User messages, assistant messages, and bold **mentions** from
+        assistant messages in order of appearance
+    """
+    user_messages = []
+    assistant_messages = []
+    bold_mentions = []
+    
+    # split() with a capturing group yields [preamble, role, body, role, body, ...]
+    parts = _ROLE_SPLIT_RE.split(history_context)
+    for role, body in zip(parts[1::2], parts[2::2]):
+        body = body.rstrip('\n')
+        if role[0] == 'A':
+            assistant_messages.append(body)
+            # Bold items are likely restaurant names
+            if '**' in body:
+                bold_mentions.extend(_BOLD_RE.findall(body))
+        else:
+            user_messages.append(body)
+    
+    return user_messages, assistant_messages, bold_mentions
+
+
+def _extract_dates(text: str) -> Optional[str]:
+    """Resolve the first relative date keyword in lowercased text to 'YYYY-MM-DD' or a weekend range."""
+    for keyword, weekday, extra_days, is_weekend in _DATE_KEYWORDS:
+        if keyword in text:
+            today = datetime.now()
+            days = extra_days if weekday is None else (weekday - today.weekday()) % 7 + extra_days
+            start = today + timedelta(days=days)
+            if is_weekend:
+                return f"{start.strftime('%Y-%m-%d')} to {(start + timedelta(days=1)).strftime('%Y-%m-%d')}"
+            return start.strftime('%Y-%m-%d')
+    return None
+
+
+def _extract_party_size(text: str) -> Optional[str]:
+    """Return the first party size mentioned in lowercased text, if any."""
+    for pattern in _PARTY_SIZE_RES:
+        match = pattern.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _extract_time(text: str) -> Optional[str]:
+    """Return the first time mentioned in lowercased text as 24h 'H:MM', if any."""
+    for pattern in _TIME_RES:
+        match = pattern.search(text)
+        if match:
+            if len(match.groups()) >= 3 and match.group(3):  # Has AM/PM
+                hour = int(match.group(1))
+                minutes = match.group(2) if match.group(2) else "00"
+                if match.group(3) == "pm" and hour < 12:
+                    hour += 12
+                return f"{hour}:{minutes}"
+            return f"{match.group(1)}:00"
+    return None
+
+
+@lru_cache(maxsize=512)
+def _render_task(task_type: str, query: str, history_context: str = "", dates: Optional[str] = None,
+                 time: Optional[str] = None, party_size: Optional[str] = None,
+                 is_reference_request: bool = False, referenced_item: Optional[str] = None,
+                 named_entity: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Render the static scaffold and dynamic task text for a browser agent request.
+    
+    Memoized on the full set of inputs, so follow-ups that resolve to the same
+    details over the same history reuse the rendered text.
+    
+    Args:
+        task_type: 'search', 'booking' or anything else for the default prompt
+        query: User query
+        history_context: Recent conversation history
+        dates: Dates mentioned in the request
+        time: Time requested (24h)
+        party_size: Number of people
+        is_reference_request: Whether the query refers back to a listed item
+        referenced_item: Item the query refers back to
+        named_entity: Previously mentioned place named in the query
+        
+    Returns:
+        Tuple[str, str]: The scaffold and the task text
+    """
+    # Shared request lines; optional details are left out rather than rendered blank
+    request = [f'CURRENT REQUEST: "{query}"']
+    if dates:
+        request.append(f"DATES MENTIONED: {dates}")
+    if time:
+        request.append(f"TIME REQUESTED: {time}")
+    if party_size:
+        request.append(f"PARTY SIZE: {party_size} people")
+    
+    references = [
+        f"REFERENCED ITEM: {referenced_item or ''}",
+        f"EXPLICITLY MENTIONED PLACE: {named_entity or ''}",
+    ]
+    
+    if task_type == "search":
+        scaffold = STATIC_SEARCH_SCAFFOLD
+        summary = ["Based on the user's query and conversation history, they are asking about:"]
+        if referenced_item:
+            summary.append(f" {referenced_item}")
+        if named_entity:
+            summary.append(f" {named_entity}")
+        if party_size:
+            summary.append(f" for {party_size} people")
+        if time:
+            summary.append(f" at {time}")
+        if dates:
+            summary.append(f" on {dates}")
+        
+        parts = [DYNAMIC_DELIMITER]
+        if history_context:
+            parts.append(history_context)
+        parts.append("")
+        parts.extend(request)
+        parts.extend(["", f"THIS IS A REFERENCE REQUEST: {is_reference_request}", ""])
+        parts.extend(references)
+        parts.extend([
+            "",
+            "REQUEST SUMMARY:",
+            "".join(summary),
+            "",
+            "SEARCH DETAILS:",
+            f"- Date: {dates or 'this weekend'}",
+            f"- Time: {time or '9pm'}",
+            f"- Party size: {party_size or '3'} people",
+            "",
+        ])
+    else:
+        if task_type == "booking":
+            scaffold = STATIC_BOOKING_SCAFFOLD
+        else:
+            # Default to search prompt if task_type is not recognized
+            scaffold = STATIC_DEFAULT_SCAFFOLD
+        
+        parts = [DYNAMIC_DELIMITER, "CONVERSATION CONTEXT:"]
+        if history_context:
+            parts.append(history_context)
+        parts.append("")
+        parts.extend(request)
+        parts.append("")
+        parts.extend(references)
+        if task_type == "booking":
+            parts.extend([
+                "",
+                "BOOKING DETAILS:",
+                f"- Party size: {party_size or 'Not specified'}",
+                f"- Date: {dates or 'Not specified'}",
+                f"- Time: {time or 'Not specified'}",
+            ])
+        parts.append("")
+    
+    task = "\n".join(parts)
+    
+    return scaffold, task
+
+
+# Placeholder spliced out of the precomputed prompts below
+_QUERY_SLOT = "\x00"
+
+# Task text for a request with no dates, time, party size, history or
+# reference, split around the query so only the query needs inserting
+_EMPTY_TASK_PARTS = {}
+for _task_type in ("search", "booking", "default"):
+    _scaffold, _task = _render_task(_task_type, _QUERY_SLOT)
+    _EMPTY_TASK_PARTS[_task_type] = (_scaffold, *_task.split(_QUERY_SLOT))
+del _task_type, _scaffold, _task
+
+
+def _extract_from_all_results(results: List[Any]) -> Optional[str]:
+    """Return the most useful text from a list of agent action results, if any."""
+    # Scan from the end: the latest completed action wins
+    for r in reversed(results):
+        if r.is_done and r.extracted_content:
+            return r.extracted_content
+
+    for r in reversed(results):
+        if r.extracted_content:
+            return r.extracted_content
+    
+    # If we have results but no extracted content, try to get the last action's result
+    if results:
+        last_action = results[-1]
+        if hasattr(last_action, 'result') and last_action.result:
+            return f"Found information: {str(last_action.result)}"
+        elif hasattr(last_action, 'action') and last_action.action:
+            return f"Last action performed: {str(last_action.action)}"
+    
+    return None
+
+
+# Result extractors keyed by agent result type, filled in by _resolve_extractor
+_EXTRACTOR_CACHE: Dict[type, Callable[[Any], str]] = {}
+
+
+def _resolve_extractor(agent_result: Any) -> Callable[[Any], str]:
+    """
+    Pick the extraction function for an agent result based on the attributes it exposes.
+    
+    Args:
+        agent_result: Sample result of the type being resolved
+        
+    Returns:
+        Callable: Function turning a result of that type into text
+    """
+    # Try to extract any useful information from the agent_result
+    if hasattr(agent_result, 'result'):
+        fallback = lambda a: str(a.result)
+    elif hasattr(agent_result, 'message'):
+        fallback = lambda a: str(a.message)
+    else:
+        fallback = str
+    
+    if not hasattr(agent_result, 'all_results'):
+        return fallback
+    
+    return lambda a: _extract_from_all_results(a.all_results) or fallback(a)
+
+
+class _CacheUsageLogger(BaseCallbackHandler):
+    """Logs prompt-cache writes and reads reported on each Claude response."""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = getattr(message, 'usage_metadata', None) or {}
+                details = usage.get('input_token_details') or {}
+                if details:
+                    self.logger.info(
+                        "Prompt cache usage: cache_creation_input_tokens=%s, cache_read_input_tokens=%s",
+                        details.get('cache_creation', 0),
+                        details.get('cache_read', 0)
+                    )
+
 
 class BrowserService:
     """Handles all browser automation tasks"""
 
+    __slots__ = (
+        'settings',
+        'browser_config',
+        'timeout_config',
+        'logger',
+        'claude_llm',
+        'claude_router',
+        'claude_synth',
+        'browser_config_obj',
+        '_playwright_browsers_checked',
+        '_inactivity_check_running',
+        '_anthropic_failures',
+        '_anthropic_circuit_open',
+        '_anthropic_circuit_open_time',
+        '_circuit_open',
+        '_circuit_open_time',
+        '_circuit_failure_count',
+        '_message_utils',
+        '_user_details_cache',
+        '_agent_browsers',
+        'closed_event',
+    )
+
     _instance = None
     _browsers = {}  # Dictionary to store browser instances by user_id
     _browser_config = None
     _last_activity_times = {}  # Dictionary to track activity times by user_id
     _inactivity_timeout = 1800  # Increasing timeout from 300 to 1800 seconds (30 minutes)
-    _inactivity_check_running = False
     _current_contexts = {}  # Track the current browser context by user_id
     
     # Circuit breaker for Anthropic API
-    _anthropic_failures = 0
-    _anthropic_circuit_open = False
-    _anthropic_circuit_open_time = None
     _anthropic_circuit_reset_after = 300  # Reset circuit after 5 minutes
     _anthropic_failure_threshold = 3  # Open circuit after 3 consecutive failures
     
     # General circuit breaker for API overload
-    _circuit_open = False
-    _circuit_open_time = None
-    _circuit_failure_count = 0
     _circuit_reset_threshold = 3  # Number of failures before opening circuit
     _circuit_cooldown_period = 300  # 5 minutes cooldown when circuit is open
+    
+    # Cache of profile/booking-derived user details, keyed by user_id
+    _user_details_ttl = 60  # Seconds before cached user details are refetched
+    _user_details_maxsize = 256  # Least recently used users are evicted beyond this
 
     def __new__(cls, settings: Settings):
         """Singleton pattern implementation"""
         if cls._instance is None:
-            cls._instance = super(BrowserService, cls).__new__(cls)
+            instance = super(BrowserService, cls).__new__(cls)
+            
+            # Mutable state lives in slots, so set it once here rather than in
+            # __init__, which runs again every time the singleton is requested
+            instance._inactivity_check_running = False
+            instance._anthropic_failures = 0
+            instance._anthropic_circuit_open = False
+            instance._anthropic_circuit_open_time = None
+            instance._circuit_open = False
+            instance._circuit_open_time = None
+            instance._circuit_failure_count = 0
+            instance._user_details_cache = OrderedDict()
+            instance._agent_browsers = {}
+            # Set once every user browser has been closed, cleared on (re)launch
+            instance.closed_event = asyncio.Event()
+            
+            cls._instance = instance
         return cls._instance
 
     def _initialize_claude_llm(self):
@@ -201,8 +673,12 @@ class BrowserService:
                 # Standard browser initialization with base config
                 self._browsers[user_id] = Browser(self._browser_config)
             
-            # Wait for browser to initialize
-            await asyncio.sleep(3)
+            self.closed_event.clear()
+            
+            # Wait for browser to be ready; a browser that never came up has
+            # already been closed and removed
+            if not await self._wait_for_browser_ready(user_id):
+                return None
             logger.info(f"Browser initialization completed for user {user_id}")
             
             # Start inactivity check only when the first browser is initialized
@@ -221,6 +697,61 @@ class BrowserService:
             logger.error(f"Error initializing browser for user {user_id}: {e}", exc_info=True)
             raise
 
+    async def _wait_for_browser_ready(self, user_id: int, timeout: float = 10.0, attempts: int = 3, backoff: float = 0.5) -> bool:
+        """
+        Wait until the user's browser has actually started or connected.
+        
+        If the browser isn't usable within the limits it is closed and removed,
+        rather than left half-launched in _browsers.
+        
+        Args:
+            user_id: User ID whose browser to probe
+            timeout: Total seconds to wait, across all probes
+            attempts: Maximum number of launch/connect attempts
+            backoff: Seconds to wait after the first failed attempt, doubled after each one
+            
+        Returns:
+            bool: Whether the browser is ready
+        """
+        browser = self._browsers[user_id]
+
+        async def probe():
+            delay = backoff
+            for attempt in range(1, attempts + 1):
+                try:
+                    # Launches/connects the underlying Playwright browser and returns once it is usable
+                    await browser.get_playwright_browser()
+                    return True
+                except Exception as e:
+                    logger.debug(f"Browser for user {user_id} not ready (attempt {attempt}/{attempts}): {e}")
+                    # Release whatever the failed launch left behind before trying again
+                    await self._close_quietly(browser)
+                    if attempt < attempts:
+                        await asyncio.sleep(delay)
+                        delay *= 2
+            return False
+
+        # Bound the whole wait, since a single failed launch can take Playwright's full timeout
+        try:
+            ready = await asyncio.wait_for(probe(), timeout=timeout)
+        except asyncio.TimeoutError:
+            ready = False
+
+        if not ready:
+            logger.warning(f"Browser for user {user_id} not ready after {attempts} attempts or {timeout}s, closing it")
+            # A launch cancelled by the timeout may have got partway; close it too
+            await self._close_quietly(browser)
+            if self._browsers.get(user_id) is browser:
+                self._browsers[user_id] = None
+        return ready
+
+    async def _close_quietly(self, browser: Browser):
+        """Close a browser that may be only partly started, ignoring errors."""
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser: {e}")
+
     async def _ensure_playwright_browsers(self):
         """Ensure Playwright browsers are installed"""
         try:
@@ -241,7 +772,7 @@ class BrowserService:
                     await test_browser.close()
                     logger.info("Playwright browsers are already installed")
                 except Exception as e:
-                    if "Executable doesn't exist" in str(e) or "Please run the following command" in str(e):
+                    if _PLAYWRIGHT_MISSING_RE.search(str(e)):
                         logger.warning("Playwright browsers not installed, attempting to install...")
                         
                         # Try to install browsers using subprocess
@@ -446,15 +977,24 @@ class BrowserService:
                     continue
                 
                 # Generate task prompt
-                prompt = await self.generate_task_prompt(query, task_type, user_details.get("history_context", ""))
+                system_message, task_message = await self.generate_task_prompt(
+                    query, task_type, user_details.get("history_context", "")
+                )
+                prompt = task_message.content
                 logger.info(f"Generated prompt for query: {query[:50]}...")
                 
-                # Create a new agent for this task
+                # Create a new agent for this task; the static scaffold rides in the
+                # system message so Claude can serve it from the prompt cache
                 logger.info(f"Creating agent for user {user_id}...")
                 agent = Agent(
                     browser=self._browsers[user_id],
                     llm=self.claude_llm,
-                    task=prompt
+                    # extract_content page summaries go to the cheaper model
+                    page_extraction_llm=self.claude_router,
+                    task=prompt,
+                    system_prompt_class=_scaffold_system_prompt(
+                        system_message.content[0]["text"], self.settings.CLAUDE_CACHE_TTL
+                    )
                 )
                 logger.info(f"Agent created successfully for user {user_id}")
                 
@@ -514,10 +1054,10 @@ class BrowserService:
                     # Log the full error and traceback
                     logger.error(f"Error running agent: {e}", exc_info=True)
                     
-                    error_str = str(e).lower()
+                    error_str = str(e)
                     
                     # Check for Playwright browser installation issues
-                    if "executable doesn't exist" in error_str or "please run the following command" in error_str:
+                    if _PLAYWRIGHT_MISSING_RE.search(error_str):
                         logger.warning("Playwright browser installation issue detected")
                         
                         # Try to install browsers
@@ -549,7 +1089,7 @@ class BrowserService:
                             result = "I'm sorry, but I encountered a technical issue. Please try again later."
                     
                     # Check for Steel.dev connection issues
-                    elif any(term in error_str for term in ["connection", "websocket", "cdp", "browser"]):
+                    elif _BROWSER_CONNECTION_ERROR_RE.search(error_str):
                         steel_connection_failures += 1
                         logger.error(f"Possible Steel.dev connection issue ({steel_connection_failures}/{max_steel_connection_failures}): {e}")
                         
@@ -561,7 +1101,7 @@ class BrowserService:
                             return "I'm sorry, but I'm having trouble connecting to the browser service. Please try again later."
                     
                     # Check for Anthropic API overload
-                    elif any(term in error_str for term in ["overloaded", "502", "too many requests", "rate limit"]):
+                    elif _API_OVERLOAD_ERROR_RE.search(error_str):
                         self._anthropic_failures += 1
                         logger.warning(f"Anthropic API overload detected. Failure count: {self._anthropic_failures}")
                         
@@ -581,7 +1121,7 @@ class BrowserService:
                         result = "I'm sorry, but I encountered an issue with the search. The service might be experiencing high demand. Let me try again."
                     
                     # Check for other API overload patterns
-                    elif any(term in error_str for term in ["timeout", "connection", "network", "socket"]):
+                    elif _NETWORK_ERROR_RE.search(error_str):
                         self._circuit_failure_count += 1
                         logger.warning(f"API connection issue detected. Failure count: {self._circuit_failure_count}")
                         
@@ -663,32 +1203,29 @@ class BrowserService:
         try:
             # If user_id is provided, clean up only that user's browser
             if user_id is not None:
-                if user_id in self._browsers and self._browsers[user_id] is not None:
+                browser = self._browsers.pop(user_id, None)
+                context = self._current_contexts.pop(user_id, None)
+                self._last_activity_times.pop(user_id, None)
+                
+                if browser is not None:
                     logger.info(f"Cleaning up browser for user {user_id}")
                     try:
                         # Close the browser
-                        await self._browsers[user_id].close()
+                        await browser.close()
                         logger.info(f"Browser successfully closed for user {user_id}")
                         
                         # For Steel.dev sessions, log that we're releasing the session
-                        if (user_id in self._current_contexts and 
-                            'session_id' in self._current_contexts[user_id] and
+                        if (context and 
+                            'session_id' in context and
                             self.browser_config.get('browserless', False) and
                             self.settings.STEEL_API_KEY):
                             
-                            session_id = self._current_contexts[user_id]['session_id']
+                            session_id = context['session_id']
                             logger.info(f"Releasing Steel.dev session {session_id} for user {user_id}")
                             # Session will be automatically released when connection is closed
                     
                     except Exception as e:
                         logger.warning(f"Error closing browser for user {user_id}: {e}")
-                    finally:
-                        # Clean up references
-                        self._browsers[user_id] = None
-                        if user_id in self._last_activity_times:
-                            del self._last_activity_times[user_id]
-                        if user_id in self._current_contexts:
-                            del self._current_contexts[user_id]
                 else:
                     logger.debug(f"No browser instance to clean up for user {user_id}")
             else:
@@ -727,12 +1264,15 @@ class BrowserService:
             logger.error(f"Error in cleanup: {e}")
             # Make sure to reset references even if cleanup fails
             if user_id is not None:
-                if user_id in self._browsers:
-                    self._browsers[user_id] = None
-                if user_id in self._last_activity_times:
-                    del self._last_activity_times[user_id]
-                if user_id in self._current_contexts:
-                    del self._current_contexts[user_id]
+                self._browsers.pop(user_id, None)
+                self._last_activity_times.pop(user_id, None)
+                self._current_contexts.pop(user_id, None)
+        
+        # The search-agent browsers are shared by every user, so only a global
+        # cleanup may close them
+        if user_id is None:
+            await self._close_agent_browsers()
+        self._signal_if_closed()
 
     async def force_close_browser(self, user_id: int = None):
         """
@@ -744,30 +1284,28 @@ class BrowserService:
         try:
             if user_id is not None:
                 # Force close specific user's browser
-                if user_id in self._browsers and self._browsers[user_id] is not None:
+                browser = self._browsers.pop(user_id, None)
+                context = self._current_contexts.pop(user_id, None)
+                self._last_activity_times.pop(user_id, None)
+                
+                if browser is not None:
                     logger.info(f"Force closing browser for user {user_id}")
                     try:
-                        await self._browsers[user_id].close()
+                        await browser.close()
                         logger.info(f"Browser successfully force closed for user {user_id}")
                         
                         # Log Steel.dev session release
-                        if (user_id in self._current_contexts and 
-                            'session_id' in self._current_contexts[user_id] and
+                        if (context and 
+                            'session_id' in context and
                             self.browser_config.get('browserless', False) and
                             self.settings.STEEL_API_KEY):
                             
-                            session_id = self._current_contexts[user_id]['session_id']
+                            session_id = context['session_id']
                             logger.info(f"Force releasing Steel.dev session {session_id} for user {user_id}")
                             # Session will be automatically released when connection is closed
                         
                     except Exception as e:
                         logger.warning(f"Error force closing browser for user {user_id}: {e}")
-                    finally:
-                        self._browsers[user_id] = None
-                        if user_id in self._last_activity_times:
-                            del self._last_activity_times[user_id]
-                        if user_id in self._current_contexts:
-                            del self._current_contexts[user_id]
             else:
                 # Force close all browsers
                 for uid, browser in list(self._browsers.items()):
@@ -800,12 +1338,31 @@ class BrowserService:
             logger.error(f"Error in force_close_browser: {e}")
             # Make sure to reset references even if force close fails
             if user_id is not None:
-                if user_id in self._browsers:
-                    self._browsers[user_id] = None
-                if user_id in self._last_activity_times:
-                    del self._last_activity_times[user_id]
-                if user_id in self._current_contexts:
-                    del self._current_contexts[user_id]
+                self._browsers.pop(user_id, None)
+                self._last_activity_times.pop(user_id, None)
+                self._current_contexts.pop(user_id, None)
+        
+        # The search-agent browsers are shared by every user, so only a global
+        # cleanup may close them
+        if user_id is None:
+            await self._close_agent_browsers()
+        self._signal_if_closed()
+
+    async def _close_agent_browsers(self):
+        """Close and forget the shared browsers of the standalone search agents."""
+        agent_browsers = list(self._agent_browsers.items())
+        self._agent_browsers.clear()
+        for name, browser in agent_browsers:
+            try:
+                await browser.close()
+                logger.info(f"Closed shared browser for {name}")
+            except Exception as e:
+                logger.warning(f"Error closing shared browser for {name}: {e}")
+
+    def _signal_if_closed(self):
+        """Set closed_event once no user browser is left open."""
+        if not any(self._browsers.values()):
+            self.closed_event.set()
 
     async def extend_timeout(self, user_id: int = 1, additional_seconds=1800):
         """
@@ -835,6 +1392,7 @@ class BrowserService:
         self.settings = settings
         self.browser_config = settings.get_browser_config()
         self.timeout_config = settings.get_timeout_config()
+        self._message_utils = MessageUtils()
         
         # Set up logging specifically for browser operations
         self.logger = logging.getLogger(__name__)
@@ -854,31 +1412,13 @@ class BrowserService:
         self.logger.info(f"Browser config initialized: {self.browser_config}")
         self.logger.info("BrowserService initialized")
         
-        # Initialize Claude LLM for browser use
+        # Initialize Claude LLMs: Sonnet drives the browser agent, Haiku handles the
+        # agent's page-extraction calls
         try:
-            # Use OpenRouter for Claude access if API key is available
-            if hasattr(settings, 'OPENROUTER_API_KEY') and settings.OPENROUTER_API_KEY:
-                from langchain_openai import ChatOpenAI
-                
-                # Log the model we're trying to use
-                self.logger.info(f"Initializing Claude via OpenRouter with model: {settings.CLAUDE_MODEL}")
-                
-                # Initialize Claude LLM with OpenRouter
-                self.claude_llm = ChatOpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=settings.OPENROUTER_API_KEY,
-                    model=settings.CLAUDE_MODEL,
-                    max_tokens=4096
-                )
-                self.logger.info(f"Successfully initialized Claude LLM via OpenRouter")
-            else:
-                # Fall back to Anthropic direct API
-                from langchain_anthropic import ChatAnthropic
-                
-                self.logger.info(f"Initializing Claude directly via Anthropic API with model: {settings.CLAUDE_MODEL}")
-                # Initialize Claude LLM
-                self.claude_llm = ChatAnthropic(model=settings.CLAUDE_MODEL)
-                self.logger.info(f"Successfully initialized Claude LLM via Anthropic API")
+            self.claude_synth = self._build_claude_client(settings.CLAUDE_SONNET_MODEL)
+            self.claude_router = self._build_claude_client(settings.CLAUDE_HAIKU_MODEL, max_tokens=2048)
+            # Existing call sites drive the browser agent through claude_llm
+            self.claude_llm = self.claude_synth
             
             # Configure base browser config with only valid parameters
             self.browser_config_obj = BrowserConfig(
@@ -896,6 +1436,48 @@ class BrowserService:
             self.logger.error(f"Error initializing Claude LLM or browser config: {e}", exc_info=True)
             raise
 
+    def _build_claude_client(self, model: str, max_tokens: int = 4096):
+        """
+        Create a Claude chat client, preferring OpenRouter when a key is configured.
+        
+        Args:
+            model: Claude model name
+            max_tokens: Maximum tokens per completion
+            
+        Returns:
+            A LangChain chat model for the requested Claude model
+        """
+        settings = self.settings
+        
+        # Use OpenRouter for Claude access if API key is available
+        if hasattr(settings, 'OPENROUTER_API_KEY') and settings.OPENROUTER_API_KEY:
+            self.logger.info(f"Initializing Claude via OpenRouter with model: {model}")
+            client = ChatOpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=settings.OPENROUTER_API_KEY,
+                model=model,
+                max_tokens=max_tokens,
+                callbacks=[_CacheUsageLogger(self.logger)]
+            )
+            self.logger.info(f"Successfully initialized Claude LLM via OpenRouter: {model}")
+            return client
+        
+        # Fall back to Anthropic direct API
+        from langchain_anthropic import ChatAnthropic
+        
+        self.logger.info(f"Initializing Claude directly via Anthropic API with model: {model}")
+        anthropic_beta = "prompt-caching-2024-07-31"
+        if settings.CLAUDE_CACHE_TTL == "1h":
+            anthropic_beta += ",extended-cache-ttl-2025-04-11"
+        client = ChatAnthropic(
+            model=model,
+            max_tokens=max_tokens,
+            model_kwargs={"extra_headers": {"anthropic-beta": anthropic_beta}},
+            callbacks=[_CacheUsageLogger(self.logger)]
+        )
+        self.logger.info(f"Successfully initialized Claude LLM via Anthropic API: {model}")
+        return client
+
     async def reset_circuit_breaker(self):
         """Reset the circuit breaker state."""
         logger.info("Manually resetting circuit breaker state")
@@ -918,29 +1500,55 @@ class BrowserService:
             Dict: User details and history context
         """
         try:
-            # Initialize MessageUtils to get user profile and history
-            message_utils = MessageUtils()
-            user_details = {}
-            
-            # Get user profile info asynchronously
-            profile = await message_utils.get_user_profile(user_id)
-            booking_info = await message_utils.get_booking_info(user_id)
-            
-            # Combine profile and booking info, with booking info taking precedence
-            combined_info = {**profile, **booking_info}
+            message_utils = self._message_utils
             
-            # Map the user data to the expected keys used in prompts
-            if 'name' in combined_info:
-                user_details['user_name'] = combined_info['name']
+            # Load the user's session data once up front; the concurrent getters below
+            # would otherwise each trigger their own initialization for a new user
+            await message_utils.init_user_history(user_id)
             
-            if 'email' in combined_info:
-                user_details['user_email'] = combined_info['email']
+            cached = self._user_details_cache.get(user_id)
+            if cached is not None and time.time() - cached[0] < self._user_details_ttl:
+                self._user_details_cache.move_to_end(user_id)
+                user_details = dict(cached[1])
+                history = await message_utils.get_user_history(user_id)
+            else:
+                user_details = {}
+                
+                # Get user profile, booking info and history concurrently
+                profile, booking_info, history = await asyncio.gather(
+                    message_utils.get_user_profile(user_id),
+                    message_utils.get_booking_info(user_id),
+                    message_utils.get_user_history(user_id),
+                    return_exceptions=True,
+                )
+                if isinstance(profile, Exception):
+                    logger.warning(f"Error getting user profile for user {user_id}: {profile}")
+                    profile = {}
+                if isinstance(booking_info, Exception):
+                    logger.warning(f"Error getting booking info for user {user_id}: {booking_info}")
+                    booking_info = {}
+                if isinstance(history, Exception):
+                    logger.warning(f"Error getting history for user {user_id}: {history}")
+                    history = []
                 
-            if 'phone' in combined_info:
-                user_details['user_phone'] = combined_info['phone']
+                # Combine profile and booking info, with booking info taking precedence
+                combined_info = {**profile, **booking_info}
+                
+                # Map the user data to the expected keys used in prompts
+                if 'name' in combined_info:
+                    user_details['user_name'] = combined_info['name']
+                
+                if 'email' in combined_info:
+                    user_details['user_email'] = combined_info['email']
+                    
+                if 'phone' in combined_info:
+                    user_details['user_phone'] = combined_info['phone']
+                
+                self._user_details_cache[user_id] = (time.time(), dict(user_details))
+                self._user_details_cache.move_to_end(user_id)
+                if len(self._user_details_cache) > self._user_details_maxsize:
+                    self._user_details_cache.popitem(last=False)
             
-            # Get the user's last messages for context
-            history = await message_utils.get_user_history(user_id)
             history_context = ""
             
             # Format the last few messages for context
@@ -960,7 +1568,7 @@ class BrowserService:
             # Return empty dict on error - agent will handle missing info
             return {'history_context': ''}
 
-    async def generate_task_prompt(self, query: str, task_type: str, history_context: str = "") -> str:
+    async def generate_task_prompt(self, query: str, task_type: str, history_context: str = "") -> List[BaseMessage]:
         """
         Generates a task prompt for the browser agent.
         
@@ -970,188 +1578,78 @@ class BrowserService:
             history_context: Recent conversation history
             
         Returns:
-            str: Generated prompt
+            List[BaseMessage]: A SystemMessage holding the static scaffold as a
+            prompt-cached block, followed by a HumanMessage with the request details
         """
+        q = query.lower()
+        
         # Extract dates if present in query for any date-related searches
-        dates = None
-        if "next weekend" in query.lower():
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            days_until_saturday = (5 - today.weekday()) % 7 + 7  # Get next Saturday
-            next_saturday = today + timedelta(days=days_until_saturday)
-            next_sunday = next_saturday + timedelta(days=1)
-            dates = f"{next_saturday.strftime('%Y-%m-%d')} to {next_sunday.strftime('%Y-%m-%d')}"
-        elif "this weekend" in query.lower():
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            days_until_saturday = (5 - today.weekday()) % 7  # Get this Saturday
-            this_saturday = today + timedelta(days=days_until_saturday)
-            this_sunday = this_saturday + timedelta(days=1)
-            dates = f"{this_saturday.strftime('%Y-%m-%d')} to {this_sunday.strftime('%Y-%m-%d')}"
-        elif "saturday" in query.lower():
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            days_until_saturday = (5 - today.weekday()) % 7  # Get this Saturday
-            this_saturday = today + timedelta(days=days_until_saturday)
-            dates = f"{this_saturday.strftime('%Y-%m-%d')}"
-        elif "sunday" in query.lower():
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            days_until_sunday = (6 - today.weekday()) % 7  # Get this Sunday
-            this_sunday = today + timedelta(days=days_until_sunday)
-            dates = f"{this_sunday.strftime('%Y-%m-%d')}"
-        elif "this friday" in query.lower():
-            from datetime import datetime, timedelta
-            today = datetime.now()
-            days_until_friday = (4 - today.weekday()) % 7  # Get this Friday
-            this_friday = today + timedelta(days=days_until_friday)
-            dates = f"{this_friday.strftime('%Y-%m-%d')}"
-        elif "tomorrow" in query.lower():
-            from datetime import datetime, timedelta
-            tomorrow = datetime.now() + timedelta(days=1)
-            dates = f"{tomorrow.strftime('%Y-%m-%d')}"
-            
-        # Extract reservation details from current query
-        import re
+        dates = _extract_dates(q)
         
-        # Extract party size
-        party_size = None
-        party_size_patterns = [
-            r'(\d+)\s*people',
-            r'for\s*(\d+)',
-            r'party\s*of\s*(\d+)',
-            r'group\s*of\s*(\d+)',
-        ]
+        # Extract party size and time from current query
+        party_size = _extract_party_size(q)
+        time = _extract_time(q)
         
-        for pattern in party_size_patterns:
-            match = re.search(pattern, query.lower())
-            if match:
-                party_size = match.group(1)
-                break
+        # Decide up front which history lookups this query needs
+        # ("same" also covers "same time" and "same party")
+        needs_same_lookup = (not time or not party_size) and "same" in q
         
-        # Extract time
-        time = None
-        time_patterns = [
-            r'(\d+)(?::(\d+))?\s*(am|pm)',
-            r'at\s*(\d+)(?::(\d+))?\s*(am|pm)',
-            r'at\s*(\d+)',
-        ]
+        # Check if this is a reference request (e.g., "the first one", "third option")
+        is_reference_request = any(indicator in q for indicator in _REFERENCE_INDICATORS)
         
-        for pattern in time_patterns:
-            match = re.search(pattern, query.lower())
-            if match:
-                if len(match.groups()) >= 3 and match.group(3):  # Has AM/PM
-                    hour = int(match.group(1))
-                    minutes = match.group(2) if match.group(2) else "00"
-                    ampm = match.group(3).lower()
-                    if ampm == "pm" and hour < 12:
-                        hour += 12
-                    time = f"{hour}:{minutes}"
-                else:
-                    time = f"{match.group(1)}:00"
+        # Split conversation history once for all the lookups below; there is
+        # nothing to parse on a fresh conversation
+        if history_context:
+            previous_queries, assistant_messages, restaurant_mentions = _parse_history(history_context)
+        else:
+            previous_queries, assistant_messages, restaurant_mentions = [], [], []
         
         # If we couldn't extract, check for references to "same time" or "same party size"
-        if "same time" in query.lower() or "same party" in query.lower() or "same" in query.lower():
-            # Look for previous reservation details in conversation history
-            previous_queries = []
-            if history_context:
-                lines = history_context.split('\n')
-                for line in lines:
-                    if line.startswith('User:') or line.startswith('U:'):
-                        previous_queries.append(line)
-                        
+        if needs_same_lookup:
             # Process previous queries in reverse order (most recent first)
             for prev_query in reversed(previous_queries):
-                # Extract time from previous queries
-                if not time:
-                    for pattern in time_patterns:
-                        match = re.search(pattern, prev_query.lower())
-                        if match:
-                            if len(match.groups()) >= 3 and match.group(3):  # Has AM/PM
-                                hour = int(match.group(1))
-                                minutes = match.group(2) if match.group(2) else "00"
-                                ampm = match.group(3).lower()
-                                if ampm == "pm" and hour < 12:
-                                    hour += 12
-                                time = f"{hour}:{minutes}"
-                            else:
-                                time = f"{match.group(1)}:00"
-                            break
+                prev_q = prev_query.lower()
                 
-                # Extract party size from previous queries
+                # Extract time and party size from previous queries
+                if not time:
+                    time = _extract_time(prev_q)
                 if not party_size:
-                    for pattern in party_size_patterns:
-                        match = re.search(pattern, prev_query.lower())
-                        if match:
-                            party_size = match.group(1)
-                            break
+                    party_size = _extract_party_size(prev_q)
                 
                 # If we've found both, no need to keep searching
                 if time and party_size:
                     break
 
-        # Check if this is a reference request (e.g., "the first one", "third option")
-        reference_indicators = ["first", "second", "third", "1st", "2nd", "3rd", "that one", "last one"]
-        is_reference_request = any(indicator in query.lower() for indicator in reference_indicators)
+        # Nothing dynamic beyond the query itself: use the precomputed prompt
+        if not (dates or time or party_size or history_context or is_reference_request):
+            scaffold, head, tail = _EMPTY_TASK_PARTS.get(task_type, _EMPTY_TASK_PARTS["default"])
+            return [
+                SystemMessage(content=[_cached_text_block(scaffold, self.settings.CLAUDE_CACHE_TTL)]),
+                HumanMessage(content=head + query + tail),
+            ]
         
         # Extract the specific reference if available
         referenced_item = None
         if is_reference_request:
-            import re
-            # First, try to find the most recent assistant message with numbered items
-            assistant_messages = []
-            if history_context:
-                # Split into lines to find assistant messages
-                lines = history_context.split('\n')
-                current_message = ""
-                is_assistant = False
-                
-                for line in lines:
-                    if line.startswith('Assistant:') or line.startswith('A:'):
-                        is_assistant = True
-                        if current_message:
-                            assistant_messages.append(current_message)
-                        current_message = line
-                    elif line.startswith('User:') or line.startswith('U:'):
-                        is_assistant = False
-                        if current_message:
-                            assistant_messages.append(current_message)
-                        current_message = ""
-                    elif is_assistant:
-                        current_message += "\n" + line
-                
-                if current_message and is_assistant:
-                    assistant_messages.append(current_message)
-            
             # Find numbered items in the most recent assistant message
             if assistant_messages:
                 last_assistant_message = assistant_messages[-1]
                 # Look for numbered items (1., 2., 3. or 1-, 2-, 3- or 1), 2), 3))
-                numbered_items = re.findall(r'(\d+)[.)-]\s+\*\*([^*]+)\*\*', last_assistant_message)
+                numbered_items = _NUMBERED_RE.findall(last_assistant_message)
                 
                 # If not found, try with bullet points
                 if not numbered_items:
-                    numbered_items = re.findall(r'-\s+\*\*([^*]+)\*\*', last_assistant_message)
+                    numbered_items = _BULLET_RE.findall(last_assistant_message)
                     if numbered_items:
                         # Convert to numbered format for consistency
                         numbered_items = [(str(i+1), item) for i, item in enumerate(numbered_items)]
                 
                 # Look for reference to "first", "second", "third", etc.
-                if "first" in query.lower() or "1st" in query.lower():
-                    item_index = 0
-                elif "second" in query.lower() or "2nd" in query.lower():
-                    item_index = 1
-                elif "third" in query.lower() or "3rd" in query.lower():
-                    item_index = 2
-                elif "fourth" in query.lower() or "4th" in query.lower():
-                    item_index = 3
-                else:
-                    # Try to extract number from query (e.g., "the 2nd one")
-                    num_match = re.search(r'(\d+)', query)
-                    if num_match:
-                        item_index = int(num_match.group(1)) - 1
-                    else:
-                        item_index = None
+                item_index = next((index for token, index in _ORDINAL_MAP.items() if token in q), None)
+                if item_index is None:
+                    # Try to extract number from query (e.g., "option 5")
+                    num_match = _NUM_RE.search(query)
+                    item_index = int(num_match.group(1)) - 1 if num_match else None
                 
                 if item_index is not None and numbered_items and item_index < len(numbered_items):
                     referenced_item = numbered_items[item_index][1].strip()
@@ -1159,156 +1657,21 @@ class BrowserService:
         # Extract specific named entities (restaurants/hotels) from the query
         named_entity = None
         if not is_reference_request:
-            # Check for explicit restaurant/place mentions in the query
-            if history_context:
-                # Get all restaurants mentioned in assistant messages
-                restaurant_mentions = []
-                lines = history_context.split('\n')
-                for line in lines:
-                    if line.startswith('Assistant:') or line.startswith('A:'):
-                        # Look for bold items which are likely restaurant names
-                        bold_matches = re.findall(r'\*\*([^*]+)\*\*', line)
-                        restaurant_mentions.extend(bold_matches)
-                
-                # Check if any restaurant name appears in the current query
-                for restaurant in restaurant_mentions:
-                    if restaurant.lower() in query.lower():
-                        named_entity = restaurant
-                        break
+            # Check if any restaurant mentioned by the assistant appears in the current query
+            for restaurant in restaurant_mentions:
+                if restaurant.lower() in q:
+                    named_entity = restaurant
+                    break
         
-        if task_type == "search":
-            prompt = f"""
-            !!! IMPORTANT - READ CAREFULLY !!!
-
-            {history_context}
-            
-            CURRENT REQUEST: "{query}"
-            {f'DATES MENTIONED: {dates}' if dates else ''}
-            {f'TIME REQUESTED: {time}' if time else ''}
-            {f'PARTY SIZE: {party_size} people' if party_size else ''}
-            
-            THIS IS A REFERENCE REQUEST: {is_reference_request}
-            
-            REFERENCED ITEM: {referenced_item if referenced_item else ""}
-            EXPLICITLY MENTIONED PLACE: {named_entity if named_entity else ""}
-
-            STEP 1: UNDERSTAND WHAT THE USER IS ASKING FOR
-            {
-            "Based on the user's query and conversation history, they are asking about:" + 
-            (f" {referenced_item}" if referenced_item else "") + 
-            (f" {named_entity}" if named_entity else "") +
-            (f" for {party_size} people" if party_size else "") +
-            (f" at {time}" if time else "") +
-            (f" on {dates}" if dates else "")
-            }
-            
-            TIME LIMIT: 90 seconds total
-            
-            SEARCH STEPS:
-            1. [15s] VERIFY WHAT THE USER IS LOOKING FOR:
-               - If they mentioned a specific restaurant by name (like Yardbird or Amber), search for that
-               - If they said "the second one" or similar, find that item in the previous list
-               - Remember they're asking about availability for {party_size if party_size else 'their party'} at {time if time else 'the specified time'}
-            
-            2. [20s] Go to the official website of this SPECIFIC place:
-               - For restaurants: Search for "[restaurant name] hong kong official website"
-               - Use the restaurant's official site first before third-party booking sites
-            
-            3. [30s] Check real-time availability for these specific details:
-               - Date: {dates if dates else "this weekend"}
-               - Time: {time if time else "9pm"} as mentioned
-               - Party size: {party_size if party_size else "3"} people
-               - Look for reservation system, booking form, or contact information
-               - MOST IMPORTANTLY: Find and copy the EXACT BOOKING URL for this restaurant
-            
-            4. [25s] Gather all relevant details:
-               - Whether there is availability for the exact requested time/date/party size
-               - If the exact time is not available, what alternatives are offered
-               - If they don't take reservations, explain their policy clearly
-               - Booking conditions and contact information
-               - Price range if available (average cost per person)
-               - The DIRECT BOOKING LINK that a user could click to make a reservation
-            
-            FORMAT RESULTS:
-            - Start with a clear statement about the specific restaurant and its availability
-            - Be explicit about which restaurant you checked
-            - Include price range if available
-            - Always include the DIRECT BOOKING LINK if available
-            - End with an offer to book on behalf of the user
-            
-            IMPORTANT: 
-            - Make absolutely certain you are checking the CORRECT restaurant from the conversation.
-            - The booking link is CRITICAL - users need to be able to book directly.
-            - If you find a booking platform (OpenTable, Resy, etc.), provide the EXACT link to that specific restaurant.
-            """
-            return prompt
-        elif task_type == "booking":
-            return f"""
-            CONVERSATION CONTEXT:
-            {history_context}
-            
-            CURRENT REQUEST: "{query}"
-            {f'DATES MENTIONED: {dates}' if dates else ''}
-            {f'TIME REQUESTED: {time}' if time else ''}
-            {f'PARTY SIZE: {party_size} people' if party_size else ''}
-            
-            REFERENCED ITEM: {referenced_item if referenced_item else ""}
-            EXPLICITLY MENTIONED PLACE: {named_entity if named_entity else ""}
-            
-            Using the conversation context above, proceed with booking exactly what the user is asking for in their most recent request.
-            Be sure to focus on the specific restaurant and booking details mentioned in the conversation history.
-            
-            TIME LIMIT: 90 seconds
-            
-            STEPS:
-            1. [20s] Identify the exact place to book based on the conversation
-               - If they mentioned a specific restaurant by name, book that one
-               - If they referred to "the second one" or similar, find that item in the previous list
-            
-            2. [30s] Access the official booking system for the specific place
-               - Use the party size: {party_size if party_size else "Not specified"}
-               - For the date: {dates if dates else "Not specified"}
-               - At time: {time if time else "Not specified"}
-            
-            3. [40s] Enter all required customer details
-               - Use the following placeholders for personal information:
-               - Name: user_name
-               - Email: user_email
-               - Phone: user_phone
-            
-            FORMAT RESULTS:
-            - Booking confirmation details
-            - Important information about the booking
-            - Next steps required to complete the booking
-            - Contact information
-            """
+        scaffold, task = _render_task(
+            task_type, query, history_context, dates, time, party_size,
+            is_reference_request, referenced_item, named_entity
+        )
         
-        # Default to search prompt if task_type is not recognized
-        return f"""
-            CONVERSATION CONTEXT:
-            {history_context}
-            
-            CURRENT REQUEST: "{query}"
-            {f'DATES MENTIONED: {dates}' if dates else ''}
-            {f'TIME REQUESTED: {time}' if time else ''}
-            {f'PARTY SIZE: {party_size} people' if party_size else ''}
-            
-            REFERENCED ITEM: {referenced_item if referenced_item else ""}
-            EXPLICITLY MENTIONED PLACE: {named_entity if named_entity else ""}
-            
-            Using the conversation context above, focus on finding information about exactly what the user is asking about in their most recent request.
-            Pay special attention if they're referring to something specific from earlier in the conversation.
-            
-            TIME LIMIT: 90 seconds total
-            
-            SEARCH STEPS:
-            1. [20s] Identify the specific place the user is referring to
-            2. [20s] Go directly to official website/platform for that specific place
-            3. [30s] Check real-time information and availability for the specified party size and time
-            4. [20s] Gather important details and booking information
-            
-            FORMAT RESULTS CLEARLY WITH ALL FOUND INFORMATION.
-            """
+        return [
+            SystemMessage(content=[_cached_text_block(scaffold, self.settings.CLAUDE_CACHE_TTL)]),
+            HumanMessage(content=task),
+        ]
 
     def extract_final_result(self, agent_result: Any) -> str:
         """
@@ -1324,36 +1687,12 @@ class BrowserService:
             if isinstance(agent_result, str):
                 return agent_result
 
-            if hasattr(agent_result, 'all_results'):
-                completed_actions = [
-                    r for r in agent_result.all_results
-                    if r.is_done and r.extracted_content
-                ]
-                if completed_actions:
-                    return completed_actions[-1].extracted_content
-
-                actions_with_content = [
-                    r for r in agent_result.all_results
-                    if r.extracted_content
-                ]
-                if actions_with_content:
-                    return actions_with_content[-1].extracted_content
-                
-                # If we have results but no extracted content, try to get the last action's result
-                if agent_result.all_results:
-                    last_action = agent_result.all_results[-1]
-                    if hasattr(last_action, 'result') and last_action.result:
-                        return f"Found information: {str(last_action.result)}"
-                    elif hasattr(last_action, 'action') and last_action.action:
-                        return f"Last action performed: {str(last_action.action)}"
-
-            # If we get here, try to extract any useful information from the agent_result
-            if hasattr(agent_result, 'result'):
-                return str(agent_result.result)
-            elif hasattr(agent_result, 'message'):
-                return str(agent_result.message)
-
-            return str(agent_result)
+            # Result shapes are fixed per type, so probe each type only once
+            result_type = type(agent_result)
+            extractor = _EXTRACTOR_CACHE.get(result_type)
+            if extractor is None:
+                extractor = _EXTRACTOR_CACHE.setdefault(result_type, _resolve_extractor(agent_result))
+            return extractor(agent_result)
         
         except Exception as e:
             logger.error(f"Error extracting final result: {e}")
@@ -1377,6 +1716,24 @@ class BrowserService:
                 
             return f"I encountered an error while processing the search results: {str(e)}. Please try again with a more specific query."
 
+    def _get_agent_browser(self, agent_cfg: Dict[str, str]) -> Browser:
+        """
+        Get the shared browser for a standalone search agent, creating it on first use.
+        
+        Args:
+            agent_cfg: Static agent settings (_HOTEL_AGENT_CFG or _RESTAURANT_AGENT_CFG)
+            
+        Returns:
+            Browser: Browser reused across runs of that agent
+        """
+        name = agent_cfg["name"]
+        browser = self._agent_browsers.get(name)
+        if browser is None:
+            self.logger.info(f"Creating shared browser for {name}")
+            browser = Browser(config=self.browser_config_obj)
+            self._agent_browsers[name] = browser
+        return browser
+
     async def search_hotels(self, query, location=None, check_in=None, check_out=None):
         """
         Search for hotels based on query and optional parameters.
@@ -1390,11 +1747,9 @@ class BrowserService:
         Returns:
             list: Search results
         """
-        self.logger.info(f"Searching hotels with query: {query}, location: {location}, check_in: {check_in}, check_out: {check_out}")
+        self.logger.info("Searching hotels with query: %s, location: %s, check_in: %s, check_out: %s", query, location, check_in, check_out)
         
         try:
-            from browser_use.agent.service import Agent
-            
             # Construct search URL
             search_term = f"{query} hotel {location}" if location else f"{query} hotel"
             
@@ -1403,23 +1758,24 @@ class BrowserService:
             if check_in and check_out:
                 task += f" for dates {check_in} to {check_out}"
             
-            self.logger.info(f"Creating browser agent for task: {task}")
+            self.logger.info("Creating browser agent for task: %s", task)
             
             # Create agent
-            agent = Agent.create_browser(
-                llm=self.claude_llm,
-                browser_config=self.browser_config_obj,
-                name="HotelSearchAgent",
-                description="Agent for searching hotel information"
+            agent = Agent(
+                task=task,
+                llm=self.claude_synth,
+                page_extraction_llm=self.claude_router,
+                browser=self._get_agent_browser(_HOTEL_AGENT_CFG)
             )
             
             self.logger.info("Browser agent created successfully. Starting search...")
             
             # Run search
-            result = await agent.run(task)
+            result = await agent.run()
             
-            self.logger.info(f"Search completed. Result type: {type(result)}")
-            self.logger.info(f"Search result summary: {result[:200] if isinstance(result, str) else 'Non-string result'}")
+            # Result details are debug-only and formatted lazily
+            self.logger.debug("Search completed. Result type: %s", type(result))
+            self.logger.debug("Search result summary: %.200s", result if isinstance(result, str) else "Non-string result")
             
             return result
             
@@ -1439,11 +1795,9 @@ class BrowserService:
         Returns:
             list: Search results
         """
-        self.logger.info(f"Searching restaurants with location: {location}, cuisine: {cuisine}, price_range: {price_range}")
+        self.logger.info("Searching restaurants with location: %s, cuisine: %s, price_range: %s", location, cuisine, price_range)
         
         try:
-            from browser_use.agent.service import Agent
-            
             # Construct search query
             search_term = f"best restaurants in {location}"
             if cuisine:
@@ -1454,23 +1808,24 @@ class BrowserService:
             # Define the task
             task = f"Search for '{search_term}' and find restaurant recommendations with websites, ratings, and price ranges"
             
-            self.logger.info(f"Creating browser agent for restaurant task: {task}")
+            self.logger.info("Creating browser agent for restaurant task: %s", task)
             
             # Create agent
-            agent = Agent.create_browser(
-                llm=self.claude_llm,
-                browser_config=self.browser_config_obj,
-                name="RestaurantSearchAgent",
-                description="Agent for searching restaurant information"
+            agent = Agent(
+                task=task,
+                llm=self.claude_synth,
+                page_extraction_llm=self.claude_router,
+                browser=self._get_agent_browser(_RESTAURANT_AGENT_CFG)
             )
             
             self.logger.info("Restaurant browser agent created successfully. Starting search...")
             
             # Run search
-            result = await agent.run(task)
+            result = await agent.run()
             
-            self.logger.info(f"Restaurant search completed. Result type: {type(result)}")
-            self.logger.info(f"Restaurant search result summary: {result[:200] if isinstance(result, str) else 'Non-string result'}")
+            # Result details are debug-only and formatted lazily
+            self.logger.debug("Restaurant search completed. Result type: %s", type(result))
+            self.logger.debug("Restaurant search result summary: %.200s", result if isinstance(result, str) else "Non-string result")
             
             return result
             
@@ -0,0 +1,70 @@
+"""
+Process-wide asyncpg connection pool for direct Postgres access.
+"""
+import logging
+from typing import Optional
+import asyncio
+import asyncpg
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Decode and encode json/jsonb columns with orjson on every pooled connection"""
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(
+            type_name,
+            encoder=lambda value: orjson.dumps(value).decode(),
+            decoder=orjson.loads,
+            schema='pg_catalog'
+        )
+
+
+async def get_pool(dsn: str, statement_cache_size: int = 0) -> asyncpg.Pool:
+    """
+    Get the shared connection pool, creating it on the first call.
+
+    Every service shares this one pool so the process stays well inside the
+    Supabase pooler's connection limit. Arguments only apply to the first call.
+
+    Args:
+        dsn: Postgres connection string
+        statement_cache_size: asyncpg prepared-statement cache size per connection
+
+    Returns:
+        asyncpg.Pool: The shared pool
+    """
+    global _pool, _pool_lock
+
+    if _pool is not None:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            # Keep the statement cache at 0 behind Supavisor's transaction mode,
+            # which can't share prepared statements between clients
+            _pool = await asyncpg.create_pool(
+                dsn=dsn,
+                min_size=2,
+                max_size=5,
+                max_inactive_connection_lifetime=1800,
+                statement_cache_size=statement_cache_size,
+                init=_init_connection
+            )
+            logger.info("Postgres connection pool initialized successfully")
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the shared connection pool, if one was opened"""
+    global _pool
+
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
@@ -2,138 +2,557 @@
 Database service using Supabase for data persistence.
 """
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, Any, Optional, List
 import asyncio
+import asyncpg
+from cachetools import TTLCache
 from supabase import create_client, Client
 
 from src.config.settings import Settings
+from src.services.db_pool import get_pool, close_pool
 
 logger = logging.getLogger(__name__)
 
+# Columns that may be written through SQL; identifiers can't be bound as parameters
+_PROFILE_COLUMNS = frozenset({'name', 'email', 'phone'})
+_BOOKING_COLUMNS = frozenset({'name', 'email', 'phone', 'details'})
+
+# One fixed statement per booking field, so each can be prepared once and reused.
+# Relies on the partial unique index on booking_info (user_id) WHERE NOT completed
+_BOOKING_UPSERT_SQL = {
+    field: (
+        f"INSERT INTO booking_info (user_id, {field}, completed) VALUES ($1, $2, false) "
+        f"ON CONFLICT (user_id) WHERE completed = false DO UPDATE SET {field} = EXCLUDED.{field}"
+    )
+    for field in _BOOKING_COLUMNS
+}
+
+# Update-then-insert fallback for schemas without that index
+_BOOKING_UPDATE_SQL = {
+    field: f"UPDATE booking_info SET {field} = $2 WHERE user_id = $1 AND completed = false"
+    for field in _BOOKING_COLUMNS
+}
+_BOOKING_INSERT_SQL = {
+    field: f"INSERT INTO booking_info (user_id, {field}, completed) VALUES ($1, $2, false)"
+    for field in _BOOKING_COLUMNS
+}
+
+# SQLSTATE raised when no unique index matches an ON CONFLICT target
+_MISSING_CONFLICT_TARGET = '42P10'
+
+
+def _is_missing_conflict_target(error: Exception) -> bool:
+    """Whether an upsert failed because the table lacks the unique index it relies on"""
+    # asyncpg errors carry the SQLSTATE as .sqlstate, PostgREST API errors as .code
+    return _MISSING_CONFLICT_TARGET in (getattr(error, 'sqlstate', None), getattr(error, 'code', None))
+
+# Single-field profile upserts, one fixed statement per field.
+# Relies on the unique constraint on user_profiles.user_id
+_PROFILE_FIELD_UPSERT_SQL = {
+    field: (
+        f"INSERT INTO user_profiles (user_id, {field}) VALUES ($1, $2) "
+        f"ON CONFLICT (user_id) DO UPDATE SET {field} = EXCLUDED.{field}"
+    )
+    for field in _PROFILE_COLUMNS
+}
+
+# History, open booking and profile for one user in a single round trip
+_USER_BUNDLE_SQL = """
+SELECT
+    (SELECT json_agg(t) FROM (
+        SELECT * FROM chat_history WHERE user_id = $1 ORDER BY created_at DESC LIMIT 50
+    ) t) AS history,
+    (SELECT row_to_json(b) FROM booking_info b WHERE b.user_id = $1 AND b.completed = false LIMIT 1) AS booking,
+    (SELECT row_to_json(p) FROM user_profiles p WHERE p.user_id = $1 LIMIT 1) AS profile
+"""
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client(url: str, key: str) -> Client:
+    """Create the Supabase client once per process and reuse it for every caller"""
+    return create_client(url, key)
+
+
+@lru_cache(maxsize=1)
+def get_supabase_db() -> "SupabaseService":
+    """Get the shared SupabaseService, built from the environment settings on first use"""
+    return SupabaseService(Settings())
+
+
 class SupabaseService:
     """Handles all database operations using Supabase"""
 
     _instance = None
     _client: Optional[Client] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    # Chat history writes are buffered and flushed in batches
+    _history_flush_interval = 0.2  # Seconds to wait before flushing a partial batch
+    _history_batch_size = 32  # Flush immediately once this many rows are queued
+    _history_max_pending = 1000  # Oldest rows are dropped beyond this while writes keep failing
+    _history_retry_max_delay = 30  # Longest wait between retries of a failed batch
+
+    # Read caches keyed by user_id, invalidated on writes
+    _profile_cache_ttl = 300  # Profiles rarely change
+    _booking_cache_ttl = 30  # Bookings change during the booking flow
+    _read_cache_maxsize = 10_000
 
     def __new__(cls, settings: Settings):
         if cls._instance is None:
             cls._instance = super(SupabaseService, cls).__new__(cls)
             cls._instance.settings = settings
+            cls._instance._history_buffer = []
+            cls._instance._last_history_time = None
+            cls._instance._history_event = None
+            cls._instance._flush_lock = None
+            cls._instance._flush_task = None
+            cls._instance._profile_cache = TTLCache(maxsize=cls._read_cache_maxsize, ttl=cls._profile_cache_ttl)
+            cls._instance._booking_cache = TTLCache(maxsize=cls._read_cache_maxsize, ttl=cls._booking_cache_ttl)
+            # Bumped after every write, so reads that overlapped one don't cache what they saw
+            cls._instance._cache_epoch = 0
+            # Cleared once an upsert shows the unique index it needs is missing
+            cls._instance._profile_upsert_supported = True
+            cls._instance._booking_upsert_supported = True
             cls._instance._initialize_client()
         return cls._instance
 
     def _initialize_client(self) -> None:
         """Initialize Supabase client"""
         try:
-            self._client = create_client(
+            self._client = get_supabase_client(
                 self.settings.SUPABASE_URL,
                 self.settings.SUPABASE_KEY
             )
+            # Dedicated threads for blocking REST calls, kept apart from the default pool
+            self._executor = ThreadPoolExecutor(max_workers=20, thread_name_prefix='supabase')
             logger.info("Supabase client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Supabase client: {e}", exc_info=True)
             raise
 
+    async def _get_pool(self) -> Optional[asyncpg.Pool]:
+        """
+        Get the shared asyncpg pool for direct Postgres access.
+
+        Returns:
+            Optional[asyncpg.Pool]: The pool, or None if no Postgres DSN is configured
+            and queries should go through the Supabase REST client
+        """
+        if not self.settings.SUPABASE_PG_DSN:
+            return None
+        return await get_pool(
+            self.settings.SUPABASE_PG_DSN,
+            self.settings.SUPABASE_PG_STATEMENT_CACHE_SIZE
+        )
+
+    async def _execute(self, query: Any) -> Any:
+        """
+        Execute a supabase-py query on the service's thread pool.
+
+        Args:
+            query: Query builder, fully built in the calling thread
+
+        Returns:
+            The query's API response
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, query.execute)
+
+    async def close(self) -> None:
+        """Flush buffered chat history and close the Postgres connection pool, if one was opened"""
+        await self.flush()
+        await close_pool()
+
+    def _invalidate_cached(self, cache: TTLCache, user_id: int) -> None:
+        """
+        Drop a user's cached row once a write has finished.
+
+        A read that ran alongside the write may have cached the old row again, or
+        may still be about to; bumping the epoch stops the latter from caching.
+        """
+        cache.pop(user_id, None)
+        self._cache_epoch += 1
+
     async def get_user_profile(self, user_id: int) -> Dict[str, Any]:
         """Get user profile from database"""
+        cached = self._profile_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        epoch = self._cache_epoch
         try:
-            response = await asyncio.to_thread(
-                lambda: self._client.table('user_profiles').select('*').eq('user_id', user_id).execute()
-            )
-            if response.data:
-                return response.data[0]
-            return {}
+            pool = await self._get_pool()
+            if pool:
+                row = await pool.fetchrow(
+                    "SELECT * FROM user_profiles WHERE user_id = $1 LIMIT 1", user_id
+                )
+                profile = dict(row) if row else {}
+            else:
+                response = await self._execute(
+                    self._client.table('user_profiles').select('*').eq('user_id', user_id)
+                )
+                profile = response.data[0] if response.data else {}
+
+            if epoch == self._cache_epoch:
+                self._profile_cache[user_id] = profile
+            return dict(profile)
         except Exception as e:
             logger.error(f"Error getting user profile: {e}", exc_info=True)
             return {}
 
     async def set_user_profile(self, user_id: int, profile_data: Dict[str, Any]) -> None:
         """Set or update user profile"""
+        self._profile_cache.pop(user_id, None)
         try:
-            existing = await self.get_user_profile(user_id)
-            if existing:
-                await asyncio.to_thread(
-                    lambda: self._client.table('user_profiles').update(profile_data).eq('user_id', user_id).execute()
-                )
-            else:
-                profile_data['user_id'] = user_id
-                await asyncio.to_thread(
-                    lambda: self._client.table('user_profiles').insert(profile_data).execute()
-                )
+            if self._profile_upsert_supported:
+                try:
+                    await self._upsert_profile(user_id, profile_data)
+                    return
+                except Exception as e:
+                    if not _is_missing_conflict_target(e):
+                        raise
+                    self._disable_profile_upsert()
+
+            await self._update_or_insert_profile(user_id, profile_data)
         except Exception as e:
             logger.error(f"Error setting user profile: {e}", exc_info=True)
+        finally:
+            self._invalidate_cached(self._profile_cache, user_id)
+
+    async def _upsert_profile(self, user_id: int, profile_data: Dict[str, Any]) -> None:
+        """Write a profile in one statement; needs the unique index on user_profiles.user_id"""
+        pool = await self._get_pool()
+        if pool:
+            columns = [column for column in profile_data if column in _PROFILE_COLUMNS]
+            if not columns:
+                return
+            placeholders = ", ".join(f"${i + 2}" for i in range(len(columns)))
+            assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+            await pool.execute(
+                f"INSERT INTO user_profiles (user_id, {', '.join(columns)}) VALUES ($1, {placeholders}) "
+                f"ON CONFLICT (user_id) DO UPDATE SET {assignments}",
+                user_id, *(profile_data[column] for column in columns)
+            )
+            return
+
+        await self._execute(
+            self._client.table('user_profiles').upsert(
+                {**profile_data, 'user_id': user_id}, on_conflict='user_id'
+            )
+        )
+
+    async def _update_or_insert_profile(self, user_id: int, profile_data: Dict[str, Any]) -> None:
+        """Write a profile by updating the existing row, inserting one if there is none"""
+        pool = await self._get_pool()
+        if pool:
+            columns = [column for column in profile_data if column in _PROFILE_COLUMNS]
+            if not columns:
+                return
+            values = [profile_data[column] for column in columns]
+            assignments = ", ".join(f"{column} = ${i + 2}" for i, column in enumerate(columns))
+            status = await pool.execute(
+                f"UPDATE user_profiles SET {assignments} WHERE user_id = $1", user_id, *values
+            )
+            if status == "UPDATE 0":
+                placeholders = ", ".join(f"${i + 2}" for i in range(len(columns)))
+                await pool.execute(
+                    f"INSERT INTO user_profiles (user_id, {', '.join(columns)}) VALUES ($1, {placeholders})",
+                    user_id, *values
+                )
+            return
+
+        # The update returns the rows it touched, so an empty result means no profile yet
+        response = await self._execute(
+            self._client.table('user_profiles').update(profile_data).eq('user_id', user_id)
+        )
+        if not response.data:
+            await self._execute(
+                self._client.table('user_profiles').insert({**profile_data, 'user_id': user_id})
+            )
+
+    def _disable_profile_upsert(self) -> None:
+        """Switch profile writes to update-then-insert for the rest of the process"""
+        self._profile_upsert_supported = False
+        logger.warning(
+            "user_profiles has no unique index on user_id; falling back to update-then-insert "
+            "writes (see 'Database indexes' in README.md)"
+        )
+
+    async def set_user_profile_field(self, user_id: int, field: str, value: str) -> None:
+        """Set a single user profile field, creating the profile if needed"""
+        self._profile_cache.pop(user_id, None)
+        try:
+            if self._profile_upsert_supported:
+                try:
+                    pool = await self._get_pool()
+                    if pool:
+                        statement = _PROFILE_FIELD_UPSERT_SQL.get(field)
+                        if statement is None:
+                            logger.debug(f"Ignoring unknown profile field: {field}")
+                            return
+                        await pool.execute(statement, user_id, value)
+                        return
+
+                    await self._execute(
+                        self._client.table('user_profiles').upsert(
+                            {'user_id': user_id, field: value}, on_conflict='user_id'
+                        )
+                    )
+                    return
+                except Exception as e:
+                    if not _is_missing_conflict_target(e):
+                        raise
+                    self._disable_profile_upsert()
+
+            await self._update_or_insert_profile(user_id, {field: value})
+        except Exception as e:
+            logger.error(f"Error setting user profile field: {e}", exc_info=True)
+        finally:
+            self._invalidate_cached(self._profile_cache, user_id)
 
     async def delete_user_profile(self, user_id: int) -> None:
         """Delete user profile"""
+        self._profile_cache.pop(user_id, None)
         try:
-            await asyncio.to_thread(
-                lambda: self._client.table('user_profiles').delete().eq('user_id', user_id).execute()
+            pool = await self._get_pool()
+            if pool:
+                await pool.execute("DELETE FROM user_profiles WHERE user_id = $1", user_id)
+                return
+
+            await self._execute(
+                self._client.table('user_profiles').delete().eq('user_id', user_id)
             )
         except Exception as e:
             logger.error(f"Error deleting user profile: {e}", exc_info=True)
+        finally:
+            self._invalidate_cached(self._profile_cache, user_id)
 
     async def get_user_history(self, user_id: int) -> List[Dict[str, Any]]:
         """Get user conversation history"""
         try:
-            response = await asyncio.to_thread(
-                lambda: self._client.table('chat_history').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(50).execute()
+            # Make sure queued messages are visible to the read
+            await self.flush()
+            pool = await self._get_pool()
+            if pool:
+                rows = await pool.fetch(
+                    "SELECT * FROM chat_history WHERE user_id = $1 ORDER BY created_at DESC LIMIT 50",
+                    user_id
+                )
+                return [dict(row) for row in rows]
+
+            response = await self._execute(
+                self._client.table('chat_history').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(50)
             )
             return response.data
         except Exception as e:
             logger.error(f"Error getting chat history: {e}", exc_info=True)
             return []
 
-    async def add_to_history(self, user_id: int, role: str, content: str) -> None:
-        """Add message to chat history"""
+    async def get_user_bundle(self, user_id: int) -> Dict[str, Any]:
+        """
+        Get a user's history, open booking and profile together.
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            Dict[str, Any]: 'history' (list), 'booking_info' (dict) and 'profile' (dict)
+        """
+        epoch = self._cache_epoch
         try:
-            await asyncio.to_thread(
-                lambda: self._client.table('chat_history').insert({
-                    'user_id': user_id,
-                    'role': role,
-                    'content': content
-                }).execute()
-            )
+            await self.flush()
+            pool = await self._get_pool()
+            if pool:
+                # JSON columns arrive decoded by the connection's orjson codec
+                row = await pool.fetchrow(_USER_BUNDLE_SQL, user_id)
+                booking_info = row['booking'] or {}
+                profile = row['profile'] or {}
+                if epoch == self._cache_epoch:
+                    self._booking_cache[user_id] = booking_info
+                    self._profile_cache[user_id] = profile
+                return {
+                    'history': row['history'] or [],
+                    'booking_info': dict(booking_info),
+                    'profile': dict(profile),
+                }
         except Exception as e:
-            logger.error(f"Error adding to chat history: {e}", exc_info=True)
+            logger.error(f"Error getting user bundle, falling back to separate queries: {e}", exc_info=True)
+
+        # The getters handle their own errors, so these can run side by side
+        history, booking_info, profile = await asyncio.gather(
+            self.get_user_history(user_id),
+            self.get_booking_info(user_id),
+            self.get_user_profile(user_id)
+        )
+        return {'history': history, 'booking_info': booking_info, 'profile': profile}
+
+    async def add_to_history(self, user_id: int, role: str, content: str) -> None:
+        """Queue a message for the chat history; rows are written in batches"""
+        if self._history_event is None:
+            self._history_event = asyncio.Event()
+
+        # Rows in one batch would otherwise share the insert's now(), so stamp
+        # each one here, strictly increasing, to keep ORDER BY created_at exact
+        created_at = datetime.now(timezone.utc)
+        if self._last_history_time is not None and created_at <= self._last_history_time:
+            created_at = self._last_history_time + timedelta(microseconds=1)
+        self._last_history_time = created_at
+        self._history_buffer.append((user_id, role, content, created_at))
+
+        if len(self._history_buffer) >= self._history_batch_size:
+            self._history_event.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        """Flush queued history rows every interval, or sooner when a batch fills up"""
+        delay = self._history_flush_interval
+        while self._history_buffer:
+            try:
+                await asyncio.wait_for(self._history_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._history_event.clear()
+            # Back off while writes keep failing, rather than retrying every interval
+            if await self.flush():
+                delay = self._history_flush_interval
+            else:
+                delay = min(delay * 2, self._history_retry_max_delay)
+
+    async def flush(self) -> bool:
+        """
+        Write all queued chat history rows in a single batch.
+
+        Returns:
+            bool: False if the write failed and the rows were queued again
+        """
+        if not self._history_buffer:
+            return True
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        # Serialize flushes so batches land in the order they were queued
+        async with self._flush_lock:
+            rows, self._history_buffer = self._history_buffer, []
+            if not rows:
+                return True
+            try:
+                pool = await self._get_pool()
+                if pool:
+                    async with pool.acquire() as conn:
+                        await conn.executemany(
+                            "INSERT INTO chat_history (user_id, role, content, created_at) "
+                            "VALUES ($1, $2, $3, $4::timestamptz)",
+                            rows
+                        )
+                    return True
+
+                await self._execute(
+                    self._client.table('chat_history').insert([
+                        {'user_id': user_id, 'role': role, 'content': content, 'created_at': created_at.isoformat()}
+                        for user_id, role, content, created_at in rows
+                    ])
+                )
+                return True
+            except Exception as e:
+                logger.error(f"Error adding {len(rows)} messages to chat history, will retry: {e}", exc_info=True)
+                # Put the batch back ahead of anything queued since, keeping order
+                self._history_buffer[:0] = rows
+                overflow = len(self._history_buffer) - self._history_max_pending
+                if overflow > 0:
+                    del self._history_buffer[:overflow]
+                    logger.error(f"Dropped {overflow} oldest queued chat history messages")
+                return False
 
     async def get_booking_info(self, user_id: int) -> Dict[str, Any]:
         """Get user's current booking information"""
+        cached = self._booking_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        epoch = self._cache_epoch
         try:
-            response = await asyncio.to_thread(
-                lambda: self._client.table('booking_info').select('*').eq('user_id', user_id).is_('completed', False).execute()
-            )
-            if response.data:
-                return response.data[0]
-            return {}
+            pool = await self._get_pool()
+            if pool:
+                row = await pool.fetchrow(
+                    "SELECT * FROM booking_info WHERE user_id = $1 AND completed = false LIMIT 1",
+                    user_id
+                )
+                booking_info = dict(row) if row else {}
+            else:
+                response = await self._execute(
+                    self._client.table('booking_info').select('*').eq('user_id', user_id).is_('completed', False)
+                )
+                booking_info = response.data[0] if response.data else {}
+
+            if epoch == self._cache_epoch:
+                self._booking_cache[user_id] = booking_info
+            return dict(booking_info)
         except Exception as e:
             logger.error(f"Error getting booking info: {e}", exc_info=True)
             return {}
 
     async def set_booking_info(self, user_id: int, field: str, value: str) -> None:
         """Set booking information field"""
+        self._booking_cache.pop(user_id, None)
         try:
+            pool = await self._get_pool()
+            if pool:
+                if field not in _BOOKING_COLUMNS:
+                    logger.debug(f"Ignoring unknown booking field: {field}")
+                    return
+                if self._booking_upsert_supported:
+                    try:
+                        await pool.execute(_BOOKING_UPSERT_SQL[field], user_id, value)
+                        return
+                    except asyncpg.PostgresError as e:
+                        if not _is_missing_conflict_target(e):
+                            raise
+                        self._booking_upsert_supported = False
+                        logger.warning(
+                            "booking_info has no partial unique index on user_id; falling back to "
+                            "update-then-insert writes (see 'Database indexes' in README.md)"
+                        )
+
+                status = await pool.execute(_BOOKING_UPDATE_SQL[field], user_id, value)
+                if status == "UPDATE 0":
+                    await pool.execute(_BOOKING_INSERT_SQL[field], user_id, value)
+                return
+
             booking_info = await self.get_booking_info(user_id)
             if booking_info:
-                await asyncio.to_thread(
-                    lambda: self._client.table('booking_info').update({field: value}).eq('id', booking_info['id']).execute()
+                await self._execute(
+                    self._client.table('booking_info').update({field: value}).eq('id', booking_info['id'])
                 )
             else:
-                await asyncio.to_thread(
-                    lambda: self._client.table('booking_info').insert({
+                await self._execute(
+                    self._client.table('booking_info').insert({
                         'user_id': user_id,
                         field: value,
                         'completed': False
-                    }).execute()
+                    })
                 )
         except Exception as e:
             logger.error(f"Error setting booking info: {e}", exc_info=True)
+        finally:
+            self._invalidate_cached(self._booking_cache, user_id)
 
     async def clear_booking_info(self, user_id: int) -> None:
         """Clear current booking information"""
+        self._booking_cache.pop(user_id, None)
         try:
-            await asyncio.to_thread(
-                lambda: self._client.table('booking_info').update({'completed': True}).eq('user_id', user_id).is_('completed', False).execute()
+            pool = await self._get_pool()
+            if pool:
+                await pool.execute(
+                    "UPDATE booking_info SET completed = true WHERE user_id = $1 AND completed = false",
+                    user_id
+                )
+                return
+
+            await self._execute(
+                self._client.table('booking_info').update({'completed': True}).eq('user_id', user_id).is_('completed', False)
             )
         except Exception as e:
-            logger.error(f"Error clearing booking info: {e}", exc_info=True) 
\ No newline at end of file
+            logger.error(f"Error clearing booking info: {e}", exc_info=True)
+        finally:
+            self._invalidate_cached(self._booking_cache, user_id)
@@ -1,64 +1,48 @@
 """
 Patch for browser_use library to handle font issues on Railway.
 """
+import importlib
 import logging
 import os
 from functools import wraps
-import importlib
 
 logger = logging.getLogger(__name__)
 
+# Evaluated once at import; the patched methods run on every agent call
+_IS_RAILWAY = bool(os.environ.get('RAILWAY_ENVIRONMENT'))
+_DISABLE_GIF = os.environ.get('DISABLE_GIF_CREATION', '').lower() == 'true'
+_SKIP_GIF = _IS_RAILWAY or _DISABLE_GIF
+
 def apply_patches():
     """Apply patches to the browser_use library to handle font issues on Railway."""
     try:
-        # Check if we're running on Railway
-        is_railway = os.environ.get('RAILWAY_ENVIRONMENT', '') != ''
-        disable_gif = os.environ.get('DISABLE_GIF_CREATION', 'false').lower() == 'true'
-        
-        if not (is_railway or disable_gif):
+        if not _SKIP_GIF:
             logger.info("Not running on Railway and GIF creation not disabled - skipping patches")
             return
             
+        # Import browser_use here rather than at module level, so it's only
+        # loaded when the patches are actually needed. execute_search relies on
+        # the patched run(..., disable_history=...) signature, so patching
+        # mustn't depend on something else having imported it first.
+        try:
+            agent_module = importlib.import_module('browser_use.agent.service')
+        except ImportError as e:
+            logger.warning(f"Could not import browser_use - skipping patches: {e}")
+            return
+        Agent = agent_module.Agent
+        
         logger.info("Applying patches to browser_use library for Railway compatibility")
         
-        # Try to patch the create_history_gif method in the Agent class
-        try:
-            from browser_use.agent.service import Agent
-            
-            # Store the original method
-            original_create_history_gif = Agent.create_history_gif
-            
-            @wraps(original_create_history_gif)
-            def patched_create_history_gif(self, output_path=None):
-                """Patched version of create_history_gif that handles font issues."""
-                try:
-                    # Check if we should skip GIF creation
-                    if is_railway or disable_gif:
-                        logger.info("Skipping GIF creation on Railway or due to DISABLE_GIF_CREATION=true")
-                        return None
-                    
-                    # Call the original method
-                    return original_create_history_gif(self, output_path=output_path)
-                except OSError as e:
-                    if "cannot open resource" in str(e):
-                        logger.warning(f"Font resource error during GIF creation: {e}")
-                        return None
-                    raise
-                except Exception as e:
-                    logger.warning(f"Error in create_history_gif: {e}")
-                    return None
-            
-            # Replace the method
-            Agent.create_history_gif = patched_create_history_gif
-            logger.info("Successfully patched Agent.create_history_gif")
-            
-        except (ImportError, AttributeError) as e:
-            logger.warning(f"Could not patch Agent.create_history_gif: {e}")
+        # GIF creation is always skipped here, so replace create_history_gif with
+        # a no-op stub rather than wrapping the original (and its font loading)
+        if hasattr(Agent, 'create_history_gif'):
+            Agent.create_history_gif = lambda self, output_path=None: None
+            logger.info("Successfully patched Agent.create_history_gif (skipping GIF creation)")
+        else:
+            logger.warning("Could not patch Agent.create_history_gif: Agent has no create_history_gif")
         
         # Try to patch the run method to add disable_history parameter
         try:
-            from browser_use.agent.service import Agent
-            
             # Store the original method
             original_run = Agent.run
             
@@ -70,7 +54,7 @@ def apply_patches():
                     result = await original_run(self, max_steps=max_steps)
                     
                     # Skip GIF creation if disable_history is True
-                    if not disable_history and not (is_railway or disable_gif):
+                    if not disable_history and not _SKIP_GIF:
                         try:
                             self.create_history_gif()
                         except Exception as e:
@@ -85,7 +69,7 @@ def apply_patches():
             Agent.run = patched_run
             logger.info("Successfully patched Agent.run")
             
-        except (ImportError, AttributeError) as e:
+        except AttributeError as e:
             logger.warning(f"Could not patch Agent.run: {e}")
         
     except Exception as e:
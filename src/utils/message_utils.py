@@ -3,46 +3,107 @@ Message utilities for handling user data and messages.
 """
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any
+import re
+import secrets
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Any
 from dataclasses import dataclass, field
 
-from telegram import Update
-from src.services.supabase_service import SupabaseService
+from cachetools import TTLCache
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackContext
+from src.services.supabase_service import get_supabase_db
 from src.config.settings import Settings
+from src.config.constants import MESSAGE_DELAY
 
 logger = logging.getLogger(__name__)
 
+# Whitespace between split message parts
+_PART_GAP_RE = re.compile(r'\s*')
+
+# Callback data for the "Next" button on paged messages: pg:<token>:<part index>
+PAGE_CALLBACK_PREFIX = "pg:"
+
 
 @dataclass
 class UserData:
     """Structure for storing user data"""
-    history: List[Dict[str, str]] = field(default_factory=list)
+    history: Deque[Dict[str, str]] = field(default_factory=lambda: deque(maxlen=10))
     booking_info: Dict[str, str] = field(default_factory=dict)
     last_interaction: float = 0.0
 
 
+class TelegramRateLimiter:
+    """Paces outgoing Telegram messages per chat and caps concurrent sends overall"""
+
+    def __init__(self, per_chat_interval: float = MESSAGE_DELAY, max_concurrent: int = 25):
+        self.per_chat_interval = per_chat_interval
+        # Per-chat state only lives while it matters: locks while a send for the
+        # chat is running or queued, send times until the interval has passed
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+        self._last_sent: TTLCache = TTLCache(maxsize=10_000, ttl=per_chat_interval)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def send(self, chat_id: int, send: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a send for a chat, waiting only as long as needed since its previous message.
+        
+        Args:
+            chat_id: Telegram chat ID
+            send: Zero-argument coroutine function performing the send
+            
+        Returns:
+            Whatever the send returns
+        """
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._lock_users[chat_id] = self._lock_users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                loop = asyncio.get_running_loop()
+                wait = self.per_chat_interval - (loop.time() - self._last_sent.get(chat_id, float('-inf')))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    async with self._semaphore:
+                        return await send()
+                finally:
+                    self._last_sent[chat_id] = loop.time()
+        finally:
+            # Drop the lock once no send for this chat is running or waiting
+            self._lock_users[chat_id] -= 1
+            if not self._lock_users[chat_id]:
+                del self._lock_users[chat_id]
+                del self._locks[chat_id]
+
+
 class MessageUtils:
     """Utility class for handling messages and user data"""
 
     _instance = None
     _user_data: Dict[int, Dict[str, Any]] = {}  # Cache for current session
+    _rate_limiter = TelegramRateLimiter()
+    _part_header_reserve = 20  # Room left in each split part for the "(Part i/N)" header
+    _pages: TTLCache = TTLCache(maxsize=1000, ttl=600)  # Remaining parts of paged messages by token
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(MessageUtils, cls).__new__(cls)
             cls._instance.settings = Settings()
-            cls._instance.db = SupabaseService(cls._instance.settings)
+            cls._instance.db = get_supabase_db()
         return cls._instance
 
     @classmethod
     async def init_user_history(cls, user_id: int) -> None:
         """Initialize user history if not exists"""
         if user_id not in cls._user_data:
+            bundle = await cls._instance.db.get_user_bundle(user_id)
             cls._user_data[user_id] = {
-                'history': await cls._instance.db.get_user_history(user_id),
-                'booking_info': await cls._instance.db.get_booking_info(user_id),
+                # Stored newest last; the database returns newest first
+                'history': cls._new_history(reversed(bundle['history'])),
+                'booking_info': bundle['booking_info'],
                 'has_seen_greeting': False,
-                'profile': await cls._instance.db.get_user_profile(user_id)
+                'profile': bundle['profile']
             }
 
     @classmethod
@@ -68,9 +129,9 @@ class MessageUtils:
         if user_id not in cls._user_data:
             await cls.init_user_history(user_id)
         
-        # Add to cache
+        # Add to cache; the oldest message drops off once the buffer is full
         if 'history' not in cls._user_data[user_id]:
-            cls._user_data[user_id]['history'] = []
+            cls._user_data[user_id]['history'] = cls._new_history()
         cls._user_data[user_id]['history'].append({
             'role': role,
             'content': content
@@ -84,7 +145,12 @@ class MessageUtils:
         """Get user conversation history"""
         if user_id not in cls._user_data:
             await cls.init_user_history(user_id)
-        return cls._user_data[user_id].get('history', [])
+        return list(cls._user_data[user_id].get('history', ()))
+
+    @classmethod
+    def _new_history(cls, messages=()) -> Deque[Dict[str, str]]:
+        """Create a cached history buffer holding the last MAX_HISTORY_LENGTH messages"""
+        return deque(messages, maxlen=cls._instance.settings.MAX_HISTORY_LENGTH)
 
     @classmethod
     async def get_user_profile(cls, user_id: int) -> Dict[str, str]:
@@ -104,8 +170,8 @@ class MessageUtils:
             cls._user_data[user_id]['profile'] = {}
         cls._user_data[user_id]['profile'][field] = value
         
-        # Update database
-        await cls._instance.db.set_user_profile(user_id, cls._user_data[user_id]['profile'])
+        # Update database; only the changed field is written
+        await cls._instance.db.set_user_profile_field(user_id, field, value)
 
     @classmethod
     async def clear_user_profile(cls, user_id: int) -> None:
@@ -143,7 +209,7 @@ class MessageUtils:
         await cls._instance.db.clear_booking_info(user_id)
 
     @staticmethod
-    async def send_long_message(update: Update, text: str, max_length: int = 4000) -> None:
+    async def send_long_message(update: Update, text: str, max_length: int = 4096) -> None:
         """Send long messages in chunks if needed"""
         try:
             if not text:
@@ -151,33 +217,21 @@ class MessageUtils:
                 return
 
             text = str(text)
+            chat_id = update.effective_chat.id
             if len(text) <= max_length:
-                await update.message.reply_text(text)
+                await MessageUtils._rate_limiter.send(chat_id, lambda: update.message.reply_text(text))
                 return
 
-            # Split message into parts
-            parts = []
-            while text:
-                if len(text) <= max_length:
-                    parts.append(text)
-                    break
-
-                split_point = text.rfind('\n', 0, max_length)
-                if split_point == -1:
-                    split_point = text.rfind('. ', 0, max_length)
-                if split_point == -1:
-                    split_point = max_length
-
-                parts.append(text[:split_point])
-                text = text[split_point:].strip()
-
-            # Send each part
-            for i, part in enumerate(parts):
-                if len(parts) > 1:
-                    indicator = f"(Part {i+1}/{len(parts)})\n\n"
-                    await update.message.reply_text(indicator + part)
-                else:
-                    await update.message.reply_text(part)
+            # Split message into parts, leaving room for the part headers
+            parts = MessageUtils._split_message(text, max_length - MessageUtils._part_header_reserve)
+
+            # Send only the first part; the rest are sent when the user pages through them
+            token = secrets.token_urlsafe(8)
+            MessageUtils._pages[token] = parts
+            await MessageUtils._rate_limiter.send(
+                chat_id,
+                lambda: update.message.reply_text(parts[0], reply_markup=MessageUtils._next_page_markup(token, 1))
+            )
 
         except Exception as e:
             logger.error(f"Error sending message: {e}", exc_info=True)
@@ -185,6 +239,40 @@ class MessageUtils:
                 "Sorry, I encountered an error sending the response."
             )
 
+    @staticmethod
+    def _next_page_markup(token: str, index: int) -> InlineKeyboardMarkup:
+        """Build the "Next" button pointing at part `index` of a paged message"""
+        return InlineKeyboardMarkup([[
+            InlineKeyboardButton("Next ▶", callback_data=f"{PAGE_CALLBACK_PREFIX}{token}:{index}")
+        ]])
+
+    @staticmethod
+    async def handle_page_callback(update: Update, context: CallbackContext) -> None:
+        """Send the next part of a paged message when its "Next" button is pressed"""
+        query = update.callback_query
+        try:
+            token, _, index = query.data[len(PAGE_CALLBACK_PREFIX):].rpartition(':')
+            index = int(index)
+            parts = MessageUtils._pages.get(token)
+            if not parts or index >= len(parts):
+                await query.answer("This message has expired.")
+                return
+
+            await query.answer()
+            # Only the newest part keeps a button
+            await query.edit_message_reply_markup(reply_markup=None)
+
+            part = f"(Part {index+1}/{len(parts)})\n\n" + parts[index]
+            markup = MessageUtils._next_page_markup(token, index + 1) if index + 1 < len(parts) else None
+            await MessageUtils._rate_limiter.send(
+                update.effective_chat.id,
+                lambda: query.message.reply_text(part, reply_markup=markup)
+            )
+            if markup is None:
+                MessageUtils._pages.pop(token, None)
+        except Exception as e:
+            logger.error(f"Error sending next message part: {e}", exc_info=True)
+
     @staticmethod
     def _split_message(text: str, max_length: int) -> List[str]:
         """
@@ -197,44 +285,31 @@ class MessageUtils:
         Returns:
             List[str]: Message parts
         """
+        if len(text) <= max_length:
+            return [text] if text else []
+
+        # Walk the text by offset so the remainder is never copied
+        start, end = 0, len(text)
+        while end > start and text[end - 1].isspace():
+            end -= 1
+
         parts = []
-        while text:
-            if len(text) <= max_length:
-                parts.append(text)
+        while start < end:
+            if end - start <= max_length:
+                parts.append(text[start:end])
                 break
 
             # Find the last complete sentence or line within the limit
-            split_point = text.rfind('\n', 0, max_length)
+            limit = start + max_length
+            split_point = text.rfind('\n', start + 1, limit)
             if split_point == -1:
-                split_point = text.rfind('. ', 0, max_length)
+                split_point = text.rfind('. ', start + 1, limit)
             if split_point == -1:
-                split_point = text.rfind(' ', 0, max_length)
+                split_point = text.rfind(' ', start + 1, limit)
             if split_point == -1:
-                split_point = max_length
+                split_point = limit
 
-            parts.append(text[:split_point].strip())
-            text = text[split_point:].strip()
+            parts.append(text[start:split_point].strip())
+            start = _PART_GAP_RE.match(text, split_point, end).end()
 
         return parts
-
-    @staticmethod
-    async def _send_message_parts(update: Update, parts: List[str]) -> None:
-        """
-        Sends message parts with proper formatting.
-        
-        Args:
-            update: Telegram update object
-            parts: Message parts to send
-        """
-        for i, part in enumerate(parts):
-            try:
-                if len(parts) > 1:
-                    indicator = f"(Part {i+1}/{len(parts)})\n\n"
-                    await update.message.reply_text(indicator + part)
-                else:
-                    await update.message.reply_text(part)
-                # Add small delay between messages to prevent rate limiting
-                await asyncio.sleep(0.5)
-            except Exception as e:
-                logger.error(
-                    f"Error sending message part {i+1}: {e}", exc_info=True)
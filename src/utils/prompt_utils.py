@@ -2,6 +2,7 @@
 Utilities for generating and managing prompts.
 """
 import logging
+from functools import lru_cache
 from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,7 @@ class PromptUtils:
     """Handles prompt generation and management"""
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def generate_search_prompt(query: str, context: Optional[str] = None) -> str:
         """
         Generates a search prompt with context.
@@ -81,6 +83,7 @@ class PromptUtils:
         """
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def generate_intent_prompt(message: str, history: Optional[str] = None) -> str:
         """
         Generates an intent classification prompt.
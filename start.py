@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 import http.server
-import socketserver
 import threading
-import subprocess
 import time
 import sys
 import os
+import shutil
 import logging
 
 # Configure logging
@@ -15,98 +14,190 @@ logging.basicConfig(
 )
 logger = logging.getLogger("health_check_server")
 
+def _build_response(body, include_body=True, close=False):
+    """Build a complete raw HTTP/1.1 200 response for the health check server."""
+    head = (
+        "HTTP/1.1 200 OK\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Content-Type: text/plain\r\n"
+        f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+    ).encode("ascii")
+    return head + body if include_body else head
+
+# Health check responses, built once and keyed by
+# (is /health, include body, close connection)
+_HEALTH_OK = b"OK - Health Check"
+_DEFAULT_OK = b"OK - Default Response"
+_RESPONSES = {
+    (is_health, include_body, close): _build_response(
+        _HEALTH_OK if is_health else _DEFAULT_OK, include_body, close
+    )
+    for is_health in (True, False)
+    for include_body in (True, False)
+    for close in (True, False)
+}
+
 # Define health check server
-class HealthCheckHandler(http.server.SimpleHTTPRequestHandler):
+class HealthCheckHandler(http.server.BaseHTTPRequestHandler):
+    # Keep probe connections open between requests
+    protocol_version = "HTTP/1.1"
+    # Drop idle keep-alive connections so they don't hold a server thread forever
+    timeout = 5
+
+    def _respond(self, include_body):
+        # close_connection reflects the request's Connection header and HTTP version
+        key = (self.path == "/health", include_body, self.close_connection)
+        self.wfile.write(_RESPONSES[key])
+
     def do_GET(self):
-        logger.info(f"Health check request received: {self.path}")
+        # Probes hit this every few seconds, so don't log them at INFO
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Health check request received: {self.path}")
         # Always respond with 200 OK regardless of the path
-        self.send_response(200)
-        self.send_header("Content-type", "text/plain")
-        self.end_headers()
-        if self.path == "/health":
-            logger.info("Health check responded with OK")
-            self.wfile.write(b"OK - Health Check")
-        else:
-            logger.info(f"Other request path: {self.path}, responding with generic OK")
-            self.wfile.write(b"OK - Default Response")
+        self._respond(include_body=True)
+
+    def do_HEAD(self):
+        # Same headers as GET, without the body
+        self._respond(include_body=False)
             
     def log_message(self, format, *args):
         # Suppress default logging to avoid console spam
         pass
 
 # Start the health check server first
-def run_health_check_server(port=8080):
+def run_health_check_server(port=8080, ready=None):
+    backoff = 1
+    while True:
+        try:
+            logger.info(f"Starting health check server on port {port}...")
+            # One thread per connection so concurrent probes and keep-alive
+            # connections don't block each other; threads are daemonic and the
+            # address is reusable, so restarts rebind immediately
+            with http.server.ThreadingHTTPServer(("0.0.0.0", port), HealthCheckHandler) as httpd:
+                logger.info(f"Health check server is running on port {port}")
+                # The socket is bound and listening, so probes will connect
+                if ready is not None:
+                    ready.set()
+                httpd.serve_forever()
+            return
+        except OSError as e:
+            logger.error(f"Error in health check server: {str(e)}")
+            # Don't exit, keep trying to serve health checks
+            time.sleep(backoff)
+            backoff = min(30, backoff * 2)
+
+def start_health_server():
+    """Start the health check server in a daemon thread."""
+    logger.info("Initializing health check server...")
+    ready = threading.Event()
+    server_thread = threading.Thread(
+        target=run_health_check_server, kwargs={"ready": ready}, daemon=True
+    )
+    server_thread.start()
+
+    # Wait until the server has bound its port, rather than a fixed delay
+    if ready.wait(timeout=5):
+        logger.info("Health check server is running")
+    else:
+        logger.warning("Health check server not ready after 5s, continuing startup")
+    return server_thread
+
+ENV_FILE = "/app/.env"
+
+# Environment variables worth logging at startup
+_WEBHOOK_ENV_KEYS = ("WEBHOOK_URL", "WEBHOOK_PATH", "USE_WEBHOOK", "RAILWAY_PUBLIC_DOMAIN")
+
+def _parse_env_key(line):
+    """Return the key a .env line assigns, or None for comments and non-assignments."""
+    key, sep, _ = line.partition("=")
+    key = key.strip()
+    if not sep or key.startswith("#"):
+        return None
+    # dotenv accepts shell-style "export KEY=value" lines
+    if key.startswith("export "):
+        key = key[len("export "):].strip()
+    return key
+
+def _read_env_file(path=ENV_FILE):
+    """Read a .env file into its lines and a dict of its values."""
     try:
-        logger.info(f"Starting health check server on port {port}...")
-        with socketserver.TCPServer(("0.0.0.0", port), HealthCheckHandler) as httpd:
-            logger.info(f"Health check server is running on port {port}")
-            httpd.serve_forever()
-    except Exception as e:
-        logger.error(f"Error in health check server: {str(e)}")
-        # Don't exit, keep trying to serve health checks
-        time.sleep(1)
-        run_health_check_server(port)
-
-# Start the health check server in a daemon thread
-logger.info("Initializing health check server...")
-server_thread = threading.Thread(target=run_health_check_server, daemon=True)
-server_thread.start()
-
-# Wait a moment to ensure the health check server is running
-time.sleep(2)
-logger.info("Health check server should be running now")
-
-# Set USE_WEBHOOK to false if RAILWAY_PUBLIC_DOMAIN is not available
-if "RAILWAY_PUBLIC_DOMAIN" in os.environ:
-    webhook_url = f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}"
-    logger.info(f"Setting WEBHOOK_URL to {webhook_url}")
-    os.environ["WEBHOOK_URL"] = webhook_url
-    os.environ["USE_WEBHOOK"] = "true"
-    
-    # Also update the .env file for persistence
+        with open(path, "r") as env_file:
+            lines = env_file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    values = {}
+    for line in lines:
+        key = _parse_env_key(line)
+        if key is not None:
+            values[key] = line.partition("=")[2].strip().strip("'\"")
+    return lines, values
+
+def _write_webhook_url(lines, webhook_url, path=ENV_FILE):
+    """Atomically rewrite the .env file with a single WEBHOOK_URL entry."""
+    lines = [line for line in lines if _parse_env_key(line) != "WEBHOOK_URL"]
+    lines.append(f"WEBHOOK_URL={webhook_url}")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+    # Keep the original file's permissions rather than the umask default
+    if os.path.exists(path):
+        shutil.copymode(path, tmp_path)
+    os.replace(tmp_path, path)
+
+def bootstrap_webhook_env():
+    """Point the webhook at the Railway public domain, or a fallback URL."""
+    # Set USE_WEBHOOK to false if RAILWAY_PUBLIC_DOMAIN is not available
+    if "RAILWAY_PUBLIC_DOMAIN" in os.environ:
+        webhook_url = f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}"
+        logger.info(f"Setting WEBHOOK_URL to {webhook_url}")
+        os.environ["WEBHOOK_URL"] = webhook_url
+        os.environ["USE_WEBHOOK"] = "true"
+        is_fallback = False
+    else:
+        # If RAILWAY_PUBLIC_DOMAIN is not set, we need to either:
+        # 1. Disable webhook mode, or
+        # 2. Set a default webhook URL
+        # Let's set a default webhook URL and keep webhook mode enabled
+        logger.warning("RAILWAY_PUBLIC_DOMAIN is not set, using a fallback URL")
+        webhook_url = "https://railway-service.up.railway.app"
+        logger.info(f"Setting fallback WEBHOOK_URL to {webhook_url}")
+        os.environ["WEBHOOK_URL"] = webhook_url
+        is_fallback = True
+
+    # Update the .env file for persistence: one read, at most one write
     try:
-        with open("/app/.env", "a") as env_file:
-            env_file.write(f"\nWEBHOOK_URL={webhook_url}\n")
-        logger.info("Updated .env file with WEBHOOK_URL")
+        lines, env_values = _read_env_file()
+        # The fallback URL is only persisted if USE_WEBHOOK is true in the env file
+        should_persist = not is_fallback or env_values.get("USE_WEBHOOK") == "true"
+        if should_persist and env_values.get("WEBHOOK_URL") != webhook_url:
+            _write_webhook_url(lines, webhook_url)
+            logger.info(f"Updated .env file with {'fallback ' if is_fallback else ''}WEBHOOK_URL")
     except Exception as e:
         logger.error(f"Error updating .env file: {str(e)}")
-else:
-    # If RAILWAY_PUBLIC_DOMAIN is not set, we need to either:
-    # 1. Disable webhook mode, or
-    # 2. Set a default webhook URL
-    # Let's set a default webhook URL and keep webhook mode enabled
-    logger.warning("RAILWAY_PUBLIC_DOMAIN is not set, using a fallback URL")
-    fallback_url = "https://railway-service.up.railway.app"
-    logger.info(f"Setting fallback WEBHOOK_URL to {fallback_url}")
-    os.environ["WEBHOOK_URL"] = fallback_url
-    
-    # Update the .env file for persistence
+
+    # Log the webhook-related environment variables for debugging
+    logger.info("Current environment variables:")
+    for key in _WEBHOOK_ENV_KEYS:
+        value = os.environ.get(key)
+        if value is not None:
+            logger.info(f"{key}={value}")
+
+def main():
+    start_health_server()
+    bootstrap_webhook_env()
+
+    # Start the main application
+    logger.info("Starting main application...")
     try:
-        with open("/app/.env", "r") as env_file:
-            env_content = env_file.read()
-            
-        # Check if USE_WEBHOOK is true in the env file
-        if "USE_WEBHOOK=true" in env_content:
-            with open("/app/.env", "a") as env_file:
-                env_file.write(f"\nWEBHOOK_URL={fallback_url}\n")
-            logger.info("Updated .env file with fallback WEBHOOK_URL")
+        # Use execv to replace the current process with the main.py process
+        # This ensures we don't have two Python interpreters running; the
+        # current interpreter is reused directly, with no $PATH lookup
+        os.execv(sys.executable, [sys.executable, "main.py"])
     except Exception as e:
-        logger.error(f"Error updating .env file: {str(e)}")
+        logger.error(f"Failed to start main application: {str(e)}")
+        # Keep the health check server running even if main app fails
+        while True:
+            time.sleep(3600)  # Sleep for an hour
 
-# Log all environment variables for debugging
-logger.info("Current environment variables:")
-for key, value in os.environ.items():
-    if key.startswith('WEBHOOK') or key.startswith('USE_') or key == 'RAILWAY_PUBLIC_DOMAIN':
-        logger.info(f"{key}={value}")
-
-# Start the main application
-logger.info("Starting main application...")
-try:
-    # Use execvp to replace the current process with the main.py process
-    # This ensures we don't have two Python interpreters running
-    os.execvp("python", ["python", "main.py"])
-except Exception as e:
-    logger.error(f"Failed to start main application: {str(e)}")
-    # Keep the health check server running even if main app fails
-    while True:
-        time.sleep(3600)  # Sleep for an hour 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,6 @@ import logging
 import os
 import sys
 import time
-from dotenv import load_dotenv
 
 # Set up logging
 logging.basicConfig(
@@ -22,7 +21,8 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Load environment variables
-load_dotenv()
+from src.config._env import load_env_once
+load_env_once()
 
 from src.config.settings import Settings
 from src.services.browser_service import BrowserService
@@ -58,11 +58,14 @@ async def run_diagnostic_test():
         logger.info("\n=== SECOND SEARCH RESULT ===")
         logger.info(second_result[:500] + "..." if len(second_result) > 500 else second_result)
         
-        # Keep the browser open for a while to monitor
-        logger.info("\nKeeping the script alive for 30 seconds to monitor browser state...")
-        for i in range(6):
-            await asyncio.sleep(5)
-            logger.info(f"Browser status check ({i+1}/6): Browser instance exists: {browser_service._browser is not None}")
+        # Keep the browser open for a while to monitor; a teardown is reported
+        # as soon as it happens rather than at the next poll
+        logger.info("\nMonitoring browser state for up to 30 seconds...")
+        try:
+            await asyncio.wait_for(browser_service.closed_event.wait(), timeout=30)
+            logger.warning("Browser closed early")
+        except asyncio.TimeoutError:
+            logger.info("Browser still alive after 30s")
         
         # Clean up at the end
         logger.info("Test complete, cleaning up browser...")
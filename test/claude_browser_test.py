@@ -4,6 +4,7 @@ Test script for Claude 3.7 browser integration with booking flow.
 import asyncio
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 from browser_use import Agent, Browser, BrowserConfig
 from langchain_openai import ChatOpenAI
@@ -93,43 +94,66 @@ async def test_claude_browser():
         logger.error(f"Error in Claude browser test: {e}", exc_info=True)
         raise
 
+# Example dialogs for the intelligent booking flows, for human reading only
+_EXAMPLES = """
+=== INTELLIGENT BOOKING FLOW EXAMPLES ===
+Example 1: User specifies time with existing profile
+User: Could you check if Hawksmoor is available tomorrow night for 2 people?
+Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.
+
+They're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.
+
+You can book directly here: https://www.opentable.co.uk/hawksmoor-air-street
+
+Would you like me to book a table for you? Just let me know which time works best! 😊
+User: Yes, book the 8pm slot please
+Bot: Great! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 8:00pm. I'll use your saved contact information.
+Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 8:00pm for 2 people. You'll receive a confirmation email shortly!
+
+Example 2: User doesn't specify time (needs to be asked)
+User: Could you check if Hawksmoor is available tomorrow night for 2 people?
+Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.
+
+They're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.
+
+You can book directly here: https://www.opentable.co.uk/hawksmoor-air-street
+
+Would you like me to book a table for you? Just let me know which time works best! 😊
+User: Yes, book it please
+Bot: Which time would you prefer? Available slots are 7:30pm, 8:00pm, and 9:15pm.
+User: 9:15pm works better
+Bot: Great! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 9:15pm. I'll use your saved contact information.
+Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 9:15pm for 2 people. You'll receive a confirmation email shortly!
+
+Example 3: No saved profile (needs to collect contact info)
+User: Could you check if Hawksmoor is available tomorrow night for 2 people?
+Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.
+
+They're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.
+
+You can book directly here: https://www.opentable.co.uk/hawksmoor-air-street
+
+Would you like me to book a table for you? Just let me know which time works best! 😊
+User: Book for 8pm please
+Bot: Perfect! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 8:00pm. Now I need your contact details. What's your name?
+User: John Smith
+Bot: Great! Now, what's your email?
+User: john.smith@example.com
+Bot: Perfect! And your phone number?
+User: +44 7700 900123
+Bot: Thanks! I'm booking your table at Hawksmoor Air Street for 2 people on Friday, April 19 at 8:00pm. This might take a minute...
+Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 8:00pm for 2 people. You'll receive a confirmation email shortly!
+"""
+
 if __name__ == "__main__":
     try:
         result = asyncio.run(test_claude_browser())
         print("\n=== TEST RESULT ===")
         print(result)
         
-        # Examples of different intelligent booking flows
-        print("\n=== INTELLIGENT BOOKING FLOW EXAMPLES ===")
-        
-        print("Example 1: User specifies time with existing profile")
-        print("User: Could you check if Hawksmoor is available tomorrow night for 2 people?")
-        print("Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.\n\nThey're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.\n\nYou can book directly here: https://www.opentable.co.uk/hawksmoor-air-street\n\nWould you like me to book a table for you? Just let me know which time works best! 😊")
-        print("User: Yes, book the 8pm slot please")
-        print("Bot: Great! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 8:00pm. I'll use your saved contact information.")
-        print("Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 8:00pm for 2 people. You'll receive a confirmation email shortly!")
-        
-        print("\nExample 2: User doesn't specify time (needs to be asked)")
-        print("User: Could you check if Hawksmoor is available tomorrow night for 2 people?")
-        print("Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.\n\nThey're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.\n\nYou can book directly here: https://www.opentable.co.uk/hawksmoor-air-street\n\nWould you like me to book a table for you? Just let me know which time works best! 😊")
-        print("User: Yes, book it please")
-        print("Bot: Which time would you prefer? Available slots are 7:30pm, 8:00pm, and 9:15pm.")
-        print("User: 9:15pm works better")
-        print("Bot: Great! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 9:15pm. I'll use your saved contact information.")
-        print("Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 9:15pm for 2 people. You'll receive a confirmation email shortly!")
-        
-        print("\nExample 3: No saved profile (needs to collect contact info)")
-        print("User: Could you check if Hawksmoor is available tomorrow night for 2 people?")
-        print("Bot: I checked Hawksmoor Air Street for tomorrow night and they have several tables available for 2 people! They have slots at 7:30pm, 8:00pm, and 9:15pm.\n\nThey're known for their steaks with mains ranging from £26-£40. They also have a pre-theater menu for £35 if you book before 6:30pm.\n\nYou can book directly here: https://www.opentable.co.uk/hawksmoor-air-street\n\nWould you like me to book a table for you? Just let me know which time works best! 😊")
-        print("User: Book for 8pm please")
-        print("Bot: Perfect! I'll book a table at Hawksmoor Air Street for 2 people tomorrow at 8:00pm. Now I need your contact details. What's your name?")
-        print("User: John Smith")
-        print("Bot: Great! Now, what's your email?")
-        print("User: john.smith@example.com")
-        print("Bot: Perfect! And your phone number?")
-        print("User: +44 7700 900123")
-        print("Bot: Thanks! I'm booking your table at Hawksmoor Air Street for 2 people on Friday, April 19 at 8:00pm. This might take a minute...")
-        print("Bot: Your table at Hawksmoor Air Street is confirmed for tomorrow at 8:00pm for 2 people. You'll receive a confirmation email shortly!")
+        # Examples of different intelligent booking flows, only when asked for
+        if os.environ.get("SHOW_EXAMPLES"):
+            sys.stdout.write(_EXAMPLES)
         
     except KeyboardInterrupt:
         print("Test interrupted by user")
@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
 """
-Test script for executing multiple searches in sequence.
-This verifies the browser remains open between searches.
+Test script for executing multiple searches concurrently.
+This verifies each search's browser stays open afterwards.
 """
 import asyncio
 import logging
 import os
 import sys
 import time
-from dotenv import load_dotenv
 
 # Configure logging
 logging.basicConfig(
@@ -22,62 +21,53 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Load environment variables
-load_dotenv()
+from src.config._env import load_env_once
+load_env_once()
 
 # Import after environment variables are loaded
 from src.config.settings import Settings
 from src.services.browser_service import BrowserService
 
+# One user_id per concurrent search, so each gets its own browser
+SEARCH_USER_IDS = (1, 2, 3)
+
 async def run_multiple_searches():
-    """Run multiple searches in sequence to test browser persistence"""
+    """Run multiple searches concurrently to test browser persistence"""
     settings = Settings()
     browser_service = BrowserService(settings)
     
     try:
-        # First search
-        logger.info("===== STARTING FIRST SEARCH =====")
-        result1 = await browser_service.execute_search(
-            "Check availability for Yardbird in Hong Kong this Saturday at a 8 PM for 2 people"
-        )
-        logger.info(f"First search completed successfully. Result length: {len(result1)}")
-        logger.info(f"First search result excerpt: {result1[:200]}...")
-        
-        # Verify browser is still active
-        logger.info(f"Browser status after first search: {'Active' if browser_service._browser is not None else 'Not active'}")
-        
-        # Wait briefly
-        logger.info("Waiting 5 seconds before next search...")
-        await asyncio.sleep(5)
-        
-        # Second search  
-        logger.info("===== STARTING SECOND SEARCH =====")
-        result2 = await browser_service.execute_search(
-            "Find flights from New York to London next weekend"
-        )
-        logger.info(f"Second search completed successfully. Result length: {len(result2)}")
-        logger.info(f"Second search result excerpt: {result2[:200]}...")
-        
-        # Verify browser is still active
-        logger.info(f"Browser status after second search: {'Active' if browser_service._browser is not None else 'Not active'}")
-        
-        # Wait briefly
-        logger.info("Waiting 5 seconds before next search...")
-        await asyncio.sleep(5)
-        
-        # Third search
-        logger.info("===== STARTING THIRD SEARCH =====")
-        result3 = await browser_service.execute_search(
-            "Check availability at the Mondrian hotel in London for this weekend"
+        # Run all three searches at once, each under its own user_id: browsers
+        # are tracked per user, and a search resets its user's browser on
+        # connection errors, so searches sharing a user would close each
+        # other's browser. Wall time is roughly the slowest single search.
+        logger.info("===== STARTING THREE CONCURRENT SEARCHES =====")
+        results = await asyncio.gather(
+            browser_service.execute_search(
+                "Check availability for Yardbird in Hong Kong this Saturday at a 8 PM for 2 people",
+                user_id=SEARCH_USER_IDS[0]
+            ),
+            browser_service.execute_search(
+                "Find flights from New York to London next weekend",
+                user_id=SEARCH_USER_IDS[1]
+            ),
+            browser_service.execute_search(
+                "Check availability at the Mondrian hotel in London for this weekend",
+                user_id=SEARCH_USER_IDS[2]
+            ),
         )
-        logger.info(f"Third search completed successfully. Result length: {len(result3)}")
-        logger.info(f"Third search result excerpt: {result3[:200]}...")
+        for i, result in enumerate(results, 1):
+            logger.info(f"Search {i} completed successfully. Result length: {len(result)}")
+            logger.info(f"Search {i} result excerpt: {result[:200]}...")
         
         # Final browser status check
-        logger.info(f"Browser status after all searches: {'Active' if browser_service._browser is not None else 'Not active'}")
+        for user_id in SEARCH_USER_IDS:
+            active = browser_service._browsers.get(user_id) is not None
+            logger.info(f"Browser status for user {user_id} after all searches: {'Active' if active else 'Not active'}")
         
         # Log all completed searches
         logger.info("===== ALL SEARCHES COMPLETED SUCCESSFULLY =====")
-        logger.info(f"Completed 3 consecutive searches with browser remaining active")
+        logger.info("Completed 3 concurrent searches with browsers remaining active")
         
         # Explicitly force close the browser at the end of the test
         logger.info("Test complete. Force closing browser...")
@@ -5,14 +5,14 @@ Test script to verify browser reuse between searches with extended timeout.
 import asyncio
 import logging
 import os
-from dotenv import load_dotenv
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
-load_dotenv()
+from src.config._env import load_env_once
+load_env_once()
 
 # Import after environment variables are loaded
 from src.config.settings import Settings
@@ -29,30 +29,28 @@ async def run_sequential_searches():
     # Log the initial timeout value
     logger.info(f"Initial inactivity timeout: {browser_service._inactivity_timeout} seconds ({browser_service._inactivity_timeout/60:.1f} minutes)")
     
-    # First search
-    logger.info("Starting first search")
-    result1 = await browser_service.execute_search("What are the best restaurants in London?")
-    logger.info(f"First search completed, result length: {len(result1)}")
-    
-    # Wait a bit to simulate user interaction
-    logger.info("Waiting 5 seconds between searches...")
-    await asyncio.sleep(5)
-    
-    # Second search with extended timeout
-    logger.info("Extending timeout before second search")
-    await browser_service.extend_timeout(additional_seconds=1800)  # Add 30 more minutes
-    
-    logger.info("Starting second search")
-    result2 = await browser_service.execute_search("What are the best hotels in Paris?")
-    logger.info(f"Second search completed, result length: {len(result2)}")
-    
-    # Third search to test multiple sequential searches
-    logger.info("Waiting 5 seconds between searches...")
-    await asyncio.sleep(5)
-    
-    logger.info("Starting third search")
-    result3 = await browser_service.execute_search("When is the next Manchester United game?")
-    logger.info(f"Third search completed, result length: {len(result3)}")
+    # All searches run back to back under the same user_id, so each one
+    # reuses the browser the first search started
+    queries = (
+        "What are the best restaurants in London?",
+        "What are the best hotels in Paris?",
+        "When is the next Manchester United game?",
+    )
+    first_browser = None
+    for i, query in enumerate(queries, 1):
+        if i == 2:
+            # Extend the timeout once the browser exists; before that it's a no-op
+            logger.info("Extending timeout before second search")
+            await browser_service.extend_timeout(additional_seconds=1800)  # Add 30 more minutes
+        
+        logger.info(f"Starting search {i}")
+        result = await browser_service.execute_search(query)
+        logger.info(f"Search {i} completed, result length: {len(result)}")
+        
+        browser = browser_service._browsers.get(1)
+        if first_browser is None:
+            first_browser = browser
+        logger.info(f"Search {i} reused the first browser: {browser is not None and browser is first_browser}")
     
     # Test complete
     logger.info("Browser reuse test completed successfully!")